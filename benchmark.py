@@ -0,0 +1,291 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import importlib.util
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+from env.camera import Camera
+from env.constants import CELL_SIZE, TRACK_CHUNK_SIZE
+from env.controls import apply_action
+from env.race_track import board as BASE_BOARD
+
+CAR_COUNTS = (1, 10, 100, 1000)
+TRACK_SCALES = (1, 2)
+PERCENTILES = (50, 90, 99)
+
+
+def scaled_board(scale):
+    # Blow every cell up into a scale x scale block so the layout and
+    # checkpoint order stay the same while the grid grows.
+    if scale == 1:
+        return BASE_BOARD
+    rows = []
+    for row in BASE_BOARD:
+        wide = "".join(cell * scale for cell in row)
+        rows.extend([wide] * scale)
+    return rows
+
+
+def summarize(samples):
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    result = {"n": int(ms.size), "mean": float(ms.mean()), "min": float(ms.min())}
+    for p in PERCENTILES:
+        result["p" + str(p)] = float(np.percentile(ms, p))
+    return result
+
+
+def time_calls(func, repeat, warmup):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_game(cars, track, vectorized):
+    from env.game import F1Game
+    return F1Game(model_dirs=[str(i) for i in range(cars)], headless=True,
+                  vectorized=vectorized, track=track)
+
+
+def drive(game, rng):
+    for car, action in zip(game._cars, rng.integers(0, 7, len(game._cars)).tolist()):
+        apply_action(car, action)
+
+
+def bench_parse_track(board, repeat, warmup, chunk="auto"):
+    from env.track import Track
+    return time_calls(lambda: Track(board, cache=False, chunk=chunk), repeat, warmup)
+
+
+def bench_load_track(board, repeat, warmup, chunk="auto"):
+    from env.track import Track
+    return time_calls(lambda: Track(board, chunk=chunk), repeat, warmup)
+
+
+def bench_render(track, repeat, warmup):
+    screen = pygame.display.set_mode((1280, 720))
+    world_w = track.width * CELL_SIZE
+    world_h = track.height * CELL_SIZE
+    zoom = min(1280 / world_w, 720 / world_h)
+    camera = Camera(1280, 720, world_w, world_h, zoom=zoom)
+    return time_calls(lambda: track.render(screen, camera), repeat, warmup)
+
+
+def bench_step(track, cars, vectorized, repeat, warmup):
+    game = make_game(cars, track, vectorized)
+    rng = np.random.default_rng(0)
+
+    def tick():
+        drive(game, rng)
+        game.step()
+
+    return time_calls(tick, repeat, warmup)
+
+
+def bench_update(track, cars, repeat, warmup):
+    # Car.update on its own: one sample is one car's update, with the same
+    # neighbour candidates the game would pass it.
+    game = make_game(cars, track, False)
+    rng = np.random.default_rng(0)
+    samples = []
+    for tick in range(warmup + max(1, repeat // max(1, cars))):
+        drive(game, rng)
+        game._sim_clock.advance()
+        game._rebuild_grid()
+        for idx, car in enumerate(game._cars):
+            candidates = game._contact_candidates(idx)
+            start = time.perf_counter()
+            car.update(candidates)
+            if tick >= warmup:
+                samples.append(time.perf_counter() - start)
+        game._update_checkpoints()
+    return samples
+
+
+def bench_observation(track, cars, repeat, warmup):
+    # One sample is a fresh observation with every key read, as a policy
+    # that consumes the whole dict would.
+    game = make_game(cars, track, False)
+    rng = np.random.default_rng(0)
+    samples = []
+    for tick in range(warmup + max(1, repeat // max(1, cars))):
+        drive(game, rng)
+        game.step()
+        for car in game._cars:
+            start = time.perf_counter()
+            obs = car.get_observation()
+            for key in obs:
+                obs[key]
+            if tick >= warmup:
+                samples.append(time.perf_counter() - start)
+    return samples
+
+
+def load_controller():
+    model_file = Path(__file__).resolve().parent / "models" / "final_model" / "model.py"
+    spec = importlib.util.spec_from_file_location("final_model.model", str(model_file))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod.Controller()
+
+
+def bench_act(track, repeat, warmup):
+    controller = load_controller()
+    if controller.policy is None:
+        raise RuntimeError("final_model weights not available")
+    game = make_game(1, track, False)
+    car = game._cars[0]
+
+    def act():
+        game.step()
+        controller.act(car)
+
+    return time_calls(act, repeat, warmup)
+
+
+def run_suite(car_counts=CAR_COUNTS, scales=TRACK_SCALES, repeat=50, warmup=5, ops=None, generated=()):
+    from env.track import Track
+    from env.track_gen import generate_board
+
+    pygame.init()
+    results = {}
+    skipped = {}
+
+    def record(key, func, *args):
+        op = key.split("[", 1)[0]
+        if ops and op not in ops:
+            return
+        print("  " + key, end="", flush=True)
+        try:
+            results[key] = summarize(func(*args))
+            print(" p50 %.3f ms" % results[key]["p50"])
+        except Exception as e:
+            skipped[key] = str(e)
+            print(" skipped: " + str(e))
+
+    for scale in scales:
+        board = scaled_board(scale)
+        record("parse_track[scale=%d]" % scale, bench_parse_track, board, repeat, warmup)
+        record("load_track[scale=%d]" % scale, bench_load_track, board, repeat, warmup)
+        track = Track(board)
+        track.distance_field
+        record("render[scale=%d]" % scale, bench_render, track, repeat, warmup)
+        for cars in car_counts:
+            tag = "cars=%d,scale=%d" % (cars, scale)
+            record("step[%s,engine=object]" % tag, bench_step, track, cars, False, repeat, warmup)
+            record("step[%s,engine=fleet]" % tag, bench_step, track, cars, True, repeat, warmup)
+            record("update[%s]" % tag, bench_update, track, cars, repeat, warmup)
+            record("observation[%s]" % tag, bench_observation, track, cars, repeat, warmup)
+        record("act[scale=%d]" % scale, bench_act, track, repeat, warmup)
+
+    # Procedural square boards, dense against the chunked large-track layout.
+    for size in generated:
+        board = generate_board(size, size, seed=0)
+        for layout, chunk in (("dense", None), ("chunked", TRACK_CHUNK_SIZE)):
+            tag = "generated=%d,layout=%s" % (size, layout)
+            record("parse_track[%s]" % tag, bench_parse_track, board, repeat, warmup, chunk)
+            record("load_track[%s]" % tag, bench_load_track, board, repeat, warmup, chunk)
+            record("render[%s]" % tag, bench_render, Track(board, chunk=chunk), repeat, warmup)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "warmup": warmup,
+            "unit": "ms",
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def _attempted(current):
+    return set(current["results"]) | set(current.get("skipped", ()))
+
+
+def compare(current, baseline, metric="p50", threshold=0.10):
+    # Returns (key, baseline, current, ratio) for every metric that got
+    # slower than the allowed threshold. A baseline metric the current run
+    # attempted but has no result for (skipped after an error) counts too,
+    # with current and ratio None. Keys this run did not select are left
+    # to unselected().
+    attempted = _attempted(current)
+    regressions = []
+    for key, base in baseline["results"].items():
+        if metric not in base or key not in attempted:
+            continue
+        now = current["results"].get(key)
+        if now is None or metric not in now:
+            regressions.append((key, base[metric], None, None))
+            continue
+        if base[metric] <= 0:
+            continue
+        ratio = now[metric] / base[metric]
+        if ratio > 1.0 + threshold:
+            regressions.append((key, base[metric], now[metric], ratio))
+    return regressions
+
+
+def unselected(current, baseline):
+    # Baseline keys outside this run's --cars/--scales/--ops selection.
+    attempted = _attempted(current)
+    return sorted(key for key in baseline["results"] if key not in attempted)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the simulator hot paths")
+    parser.add_argument("--cars", type=int, nargs="+", default=list(CAR_COUNTS))
+    parser.add_argument("--scales", type=int, nargs="+", default=list(TRACK_SCALES))
+    parser.add_argument("--ops", nargs="+", default=None,
+                        help="subset of: parse_track load_track render step update observation act")
+    parser.add_argument("--generated", type=int, nargs="*", default=[],
+                        help="also time procedurally generated boards of these sizes")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to check against")
+    parser.add_argument("--metric", default="p50")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown as a fraction of the baseline")
+    args = parser.parse_args()
+
+    report = run_suite(args.cars, args.scales, args.repeat, args.warmup, args.ops, args.generated)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"\nWrote {len(report['results'])} results to {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.metric, args.threshold)
+        others = unselected(report, baseline)
+        if others:
+            print(f"\n{len(others)} baseline results not selected in this run: " + ", ".join(others))
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%} on {args.metric} or skipped:")
+            for key, base, now, ratio in regressions:
+                if now is None:
+                    print(f"  {key}: {base:.3f} ms -> skipped ({report['skipped'].get(key, 'no ' + args.metric)})")
+                else:
+                    print(f"  {key}: {base:.3f} ms -> {now:.3f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} on {args.metric}")
@@ -1,6 +1,10 @@
 import pygame
 import math
-from env.constants import CELL_SIZE, CAR_GAP
+from env.constants import CELL_SIZE
+from car.observation import Observation
+from car.sprites import CAR_SPRITE_SIZE, SpriteAtlas
+from env.controls import (CONTROL_BACK, CONTROL_BOOST, CONTROL_BRAKE, CONTROL_FORWARD,
+                          CONTROL_LEFT, CONTROL_RESET, CONTROL_RIGHT)
 
 
 class Car:
@@ -11,16 +15,13 @@ class Car:
         self._game = game
         self._track = track
 
-        self._original_image = pygame.image.load(image_path).convert_alpha()
-        self._original_image = pygame.transform.scale(self._original_image, (12, 18))
-        self._image = self._original_image
-        self._rect = self._image.get_rect()
+        self._sprite = SpriteAtlas.get(image_path)
         
-        self._hitbox = pygame.Rect(0, 0, int(12 * 0.7), int(18 * 0.7))
+        w, h = CAR_SPRITE_SIZE
+        self._hitbox = pygame.Rect(0, 0, int(w * 0.7), int(h * 0.7))
         
         self._x = x
         self._y = y
-        self._rect.center = (x, y)
         self._hitbox.center = (x, y)
         
         self._velocity = 0
@@ -44,12 +45,16 @@ class Car:
         self._boost_power = 1.5
         self._boost_consumption_per_ms = 0.0005
         self._boost_recharge_per_ms = 0.0002
-        self._last_time = pygame.time.get_ticks()
+        self._last_time = self._game.get_ticks()
         self._collision_end_time = 0
         self._recoil_factor = 0.5
+        self._on_wall = self._track.check_collision(x, y)
+        self._obs = None
+        self._obs_tick = None
+        self._controls = 0
         
     def _accelerate(self, direction):
-        now = pygame.time.get_ticks()
+        now = self._game.get_ticks()
         if now < getattr(self, '_collision_end_time', 0):
             return
         mult = 1.0
@@ -69,6 +74,7 @@ class Car:
         else:
             self._velocity += direction * self._acceleration_rate * mult
         self._velocity = max(-self._max_velocity, min(self._velocity, self._max_velocity))
+        self._state_changed()
         if direction > 0:
             self._rev = min(1.0, self._rev + 0.02)
             self._accelerating = True
@@ -76,14 +82,16 @@ class Car:
             self._accelerating = False
     
     def _steer(self, amount):
-        now = pygame.time.get_ticks()
+        now = self._game.get_ticks()
         if now < getattr(self, '_collision_end_time', 0):
             return
         self._steering_angle += amount
         self._steering_angle = max(self._min_steering, min(self._steering_angle, self._max_steering))
+        self._state_changed()
 
     def request_boost(self):
-        now = pygame.time.get_ticks()
+        self._controls |= CONTROL_BOOST
+        now = self._game.get_ticks()
         if self._boost_energy <= 0:
             return
         if self._rev < 0.35 or self._rev > 0.75:
@@ -93,15 +101,17 @@ class Car:
         self._boost_request_time = now
 
     def brake(self):
+        self._controls |= CONTROL_BRAKE
         strength = 0.6
-        now = pygame.time.get_ticks()
+        now = self._game.get_ticks()
         if now < self._collision_end_time:
             return
         strength = max(0.0, min(1.0, strength))
         self._velocity *= (1.0 - strength)
+        self._state_changed()
     
     def update(self, all_cars=None):
-        now = pygame.time.get_ticks()
+        now = self._game.get_ticks()
         dt = now - self._last_time
         if dt < 0:
             dt = 0
@@ -125,10 +135,10 @@ class Car:
         if not self._track.check_collision(new_x, new_y):
             self._x = new_x
             self._y = new_y
-            self._rect.center = (self._x, self._y)
+            self._on_wall = False
             self._hitbox.center = (self._x, self._y)
         else:
-            now2 = pygame.time.get_ticks()
+            now2 = self._game.get_ticks()
             if now2 >= getattr(self, '_collision_end_time', 0):
                 impact_speed = abs(self._velocity)
                 s = 0.0
@@ -176,86 +186,71 @@ class Car:
                 recharge = self._boost_recharge_per_ms * dt
                 self._boost_energy = min(1.0, self._boost_energy + recharge)
         
-        self._image = pygame.transform.rotate(self._original_image, -self._angle)
-        self._rect = self._image.get_rect(center=(self._x, self._y))
         self._hitbox.center = (self._x, self._y)
 
 
     def render(self, screen, camera=None):
         if camera:
-            center = (self._x, self._y)
-            screen_pos = camera.apply(center)
-            z = int(max(1, round(camera.zoom)))
-            ow = self._original_image.get_width()
-            oh = self._original_image.get_height()
-            scaled = pygame.transform.scale(self._original_image, (ow * z, oh * z))
-            rotated = pygame.transform.rotate(scaled, -self._angle)
-            rect = rotated.get_rect(center=screen_pos)
-            screen.blit(rotated, rect)
-        else:
-            screen.blit(self._image, self._rect)
+            return self._sprite.blit(screen, camera.apply((self._x, self._y)), self._angle, int(max(1, round(camera.zoom))))
+        return self._sprite.blit(screen, (self._x, self._y), self._angle)
         
     def get_position(self):
         return (self._x, self._y)
     
     def reset(self):
+        self._controls |= CONTROL_RESET
         self._x = self.startX
         self._y = self.startY
         self._velocity = 0
         self._angle = 0
         self._steering_angle = 0
         self._collision_end_time = 0
-        self._rect.center = (self.startX, self.startY)
+        self._on_wall = self._track.check_collision(self.startX, self.startY)
         self._hitbox.center = (self.startX, self.startY)
-        self._image = self._original_image
+        # Moving a car also changes the rays and neighbours of the others.
+        self._game._invalidate_observations()
+
+    def _state_changed(self):
+        # A control changed this car's speed or steering mid-tick, so its
+        # memoized observation and the batch rows are out of date.
+        self._obs = None
+        self._game._obs_buffer_tick = -1
 
     def _is_in_collision(self):
-        return (pygame.time.get_ticks() < self._collision_end_time) or self._track.check_collision(self._x, self._y)
+        return (self._game.get_ticks() < self._collision_end_time) or self._on_wall
     
     def get_observation(self):
-        x, y = self.get_position()
-        gx = int(x // CELL_SIZE)
-        gy = int(y // CELL_SIZE)
-    
-        obs = {}
-        obs['x'] = x
-        obs['y'] = y
-        obs['angle_degrees'] = float(getattr(self, '_angle', 0.0))
-        obs['steering_angle'] = float(getattr(self, '_steering_angle', 0.0))
-        obs['speed'] = float(getattr(self, '_velocity', 0.0))
-        obs['track_coords'] = self._getTrackRecords()
-        obs['lap_progress'] = self._get_lap_progress()
-        obs['lap_number'] = self._get_lap_number()
-        lap_times, current = self._get_lap_timings()
-        obs['lap_times'] = lap_times
-        obs['current_lap_time'] = current
-        obs['collided'] = bool(self._is_in_collision())
-        obs['all_coords'] = self._game.all_coords(self._uni_index)
-        return obs
+        # Memoized until the next step, or until a control changes the
+        # state it was read from.
+        tick = (self._game._steps, self._game._obs_version)
+        if self._obs is None or self._obs_tick != tick:
+            self._obs = Observation(self, _OBS_LOADERS)
+            self._obs_tick = tick
+        return self._obs
     
     def steer_right(self):
+        self._controls |= CONTROL_RIGHT
         self._steer(10)
     
     def steer_left(self):
+        self._controls |= CONTROL_LEFT
         self._steer(-10)
     
     def accelerate_fwd(self):
+        self._controls |= CONTROL_FORWARD
         self._accelerate(1.0)
     
     def accelerate_bck(self):
+        self._controls |= CONTROL_BACK
         self._accelerate(-1.0)
 
     def _get_lap_timings(self):
-        lap_times = list([] if self._uni_index not in self._game._lap_times else self._game._lap_times[self._uni_index])
-        start = None if self._uni_index not in self._game._lap_start_time else self._game._lap_start_time[self._uni_index]
-        if start is None:
-            current = 0.0
-        else:
-            current = (pygame.time.get_ticks() - start) / 1000.0
+        lap_times = list(self._game._lap_times[self._uni_index])
+        current = (self._game.get_ticks() - self._game._lap_start_time[self._uni_index]) / 1000.0
         return lap_times, current
 
     def _get_lap_number(self):
-        return int(0 if self._uni_index not in self._game._laps_completed else self._game._laps_completed[self._uni_index]) + 1
+        return int(self._game._laps_completed[self._uni_index]) + 1
 
     def _getTrackRecords(self):
         x, y = self.get_position()
@@ -263,47 +258,36 @@ class Car:
         gy = int(y // CELL_SIZE)
         return (gx, gy)
 
-    def _checkpoint_centroid(self, cid):
-        cells = self._track.checkpoints.get(cid)
-        if not cells:
-            return None
-        sx = 0.0
-        sy = 0.0
-        for (cx, cy) in cells:
-            sx += (cx * CELL_SIZE + CELL_SIZE / 2.0)
-            sy += (cy * CELL_SIZE + CELL_SIZE / 2.0)
-        n = len(cells)
-        return (sx / n, sy / n)
+    def _next_checkpoint_id(self):
+        return int(self._game._next_checkpoint[self._uni_index])
 
     def _get_lap_progress(self):
-        total = len(self._track.checkpoints) if self._track.checkpoints else 0
-        if total == 0:
+        field = self._track.distance_field
+        if field.num_checkpoints == 0:
             return 0.0
-        collected = set() if self._uni_index not in self._game._checkpoints_collected else self._game._checkpoints_collected[self._uni_index]
-        now = None
-        completed = len(collected)
-        if completed >= total:
-            return 1.0
-        prev_id = 0
-        if collected:
-            prev_id = max(collected)
+        return field.lap_progress(self._next_checkpoint_id(), self._x, self._y)
 
-        if prev_id == 0:
-            start_x, start_y = self._track.get_start_position()
-            prev_pos = (start_x + self._uni_index * CAR_GAP, start_y)
-        else:
-            prev_pos = self._checkpoint_centroid(prev_id)
+    def _get_checkpoint_heading(self):
+        return self._track.distance_field.heading(self._next_checkpoint_id(), self._x, self._y)
 
-        next_id = prev_id + 1 if prev_id < total else 1
-        next_pos = self._checkpoint_centroid(next_id)
-        if not prev_pos or not next_pos:
-            return float(completed) / float(total)
-        car_x, car_y = self.get_position()
-        dist_total = math.hypot(next_pos[0] - prev_pos[0], next_pos[1] - prev_pos[1])
-        if dist_total <= 0.0:
-            frac = 0.0
-        else:
-            dist_to_car = math.hypot(car_x - prev_pos[0], car_y - prev_pos[1])
-            frac = max(0.0, min(1.0, dist_to_car / dist_total))
-        progress = (float(prev_id) + frac) / float(total)
-        return max(0.0, min(1.0, progress))
+    def _get_checkpoint_distance(self):
+        return self._track.distance_field.distance_to(self._next_checkpoint_id(), self._x, self._y)
+
+
+_OBS_LOADERS = {
+    'x': lambda car: car.get_position()[0],
+    'y': lambda car: car.get_position()[1],
+    'angle_degrees': lambda car: float(car._angle),
+    'steering_angle': lambda car: float(car._steering_angle),
+    'speed': lambda car: float(car._velocity),
+    'track_coords': lambda car: car._getTrackRecords(),
+    'lap_progress': lambda car: car._get_lap_progress(),
+    'next_checkpoint_heading': lambda car: car._get_checkpoint_heading(),
+    'next_checkpoint_distance': lambda car: car._get_checkpoint_distance(),
+    'lap_number': lambda car: car._get_lap_number(),
+    'lap_times': lambda car: car._get_lap_timings()[0],
+    'current_lap_time': lambda car: car._get_lap_timings()[1],
+    'collided': lambda car: bool(car._is_in_collision()),
+    'all_coords': lambda car: car._game.all_coords(car._uni_index),
+    'ray_distances': lambda car: car._game.ray_distances()[car._uni_index].tolist(),
+}
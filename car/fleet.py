@@ -0,0 +1,180 @@
+import numpy as np
+from car.car import Car
+
+
+_FLOAT_FIELDS = (
+    '_x', '_y', '_angle', '_velocity', '_steering_angle', '_rev',
+    '_boost_energy', '_boost_request_time', '_boost_start_time',
+    '_last_time', '_collision_end_time',
+)
+_BOOL_FIELDS = ('_accelerating', '_boost_active', '_on_wall')
+_INT_FIELDS = ('_controls',)
+
+
+def _array_view(name):
+    def fget(self):
+        return self._fleet.arrays[name][self._i]
+
+    def fset(self, value):
+        self._fleet.arrays[name][self._i] = value
+
+    return property(fget, fset)
+
+
+def _bezier(t, p1, p2):
+    u = 1.0 - t
+    return (3*u*u*t*p1) + (3*u*t*t*p2) + (t**3)
+
+
+class FleetCar(Car):
+    def __init__(self, fleet, index, *args):
+        self._fleet = fleet
+        self._i = index
+        super().__init__(*args)
+
+
+for _name in _FLOAT_FIELDS + _BOOL_FIELDS + _INT_FIELDS:
+    setattr(FleetCar, _name, _array_view(_name))
+
+
+class Fleet:
+    def __init__(self, game, track, capacity):
+        self._game = game
+        self._track = track
+        self.capacity = int(capacity)
+        self.count = 0
+        self.cars = []
+        self.arrays = {}
+        for name in _FLOAT_FIELDS:
+            self.arrays[name] = np.zeros(self.capacity, dtype=np.float64)
+        for name in _BOOL_FIELDS:
+            self.arrays[name] = np.zeros(self.capacity, dtype=bool)
+        for name in _INT_FIELDS:
+            self.arrays[name] = np.zeros(self.capacity, dtype=np.int64)
+
+    def add_car(self, x, y, image_path, uni, start_x, start_y):
+        if self.count >= self.capacity:
+            raise ValueError("Fleet is full (capacity=" + str(self.capacity) + ")")
+        car = FleetCar(self, self.count, x, y, image_path, uni, start_x, start_y, self._game, self._track)
+        self.cars.append(car)
+        self.count += 1
+        return car
+
+    def _views(self):
+        n = self.count
+        return {name: arr[:n] for name, arr in self.arrays.items()}
+
+    def in_collision(self, now=None):
+        a = self._views()
+        if now is None:
+            now = self._game.get_ticks()
+        return (now < a['_collision_end_time']) | a['_on_wall']
+
+    def step(self, grid=None):
+        if self.count == 0:
+            return
+        proto = self.cars[0]
+        a = self._views()
+        x = a['_x']
+        y = a['_y']
+        angle = a['_angle']
+        vel = a['_velocity']
+        steer = a['_steering_angle']
+        rev = a['_rev']
+        energy = a['_boost_energy']
+        active = a['_boost_active']
+        request = a['_boost_request_time']
+        collision_end = a['_collision_end_time']
+
+        now = self._game.get_ticks()
+        dt = np.maximum(now - a['_last_time'], 0.0)
+        a['_last_time'][:] = now
+
+        turning = np.abs(vel) > 0.1
+        angle += np.where(turning, (steer / 100.0) * proto._turn_speed * (vel / proto._max_velocity), 0.0)
+        steer *= 0.9
+
+        idle = ~a['_accelerating']
+        rev[idle] = np.maximum(0.0, rev[idle] - dt[idle] * 0.0008)
+
+        rad = np.radians(angle)
+        new_x = x + np.sin(rad) * vel
+        new_y = y - np.cos(rad) * vel
+
+        blocked = self._track.check_collisions(new_x, new_y)
+        free = ~blocked
+        x[free] = new_x[free]
+        y[free] = new_y[free]
+        a['_on_wall'][free] = False
+
+        hit = blocked & (now >= collision_end)
+        if hit.any():
+            impact_speed = np.abs(vel[hit])
+            s = np.minimum(1.0, impact_speed / float(proto._max_velocity))
+            impact_dir = np.where(vel[hit] < 0, -1.0, 1.0)
+            vel[hit] = -(impact_speed * _bezier(s, 0.2, 0.8) * proto._recoil_factor * impact_dir)
+            steer[hit] = 0
+            collision_end[hit] = now + 1000
+
+        self._resolve_car_contacts(now, grid)
+
+        vel *= proto._friction
+
+        was_active = active.copy()
+        consume = proto._boost_consumption_per_ms * dt[was_active]
+        energy[was_active] = np.maximum(0.0, energy[was_active] - consume)
+        drained = was_active & (energy <= 0)
+        active[drained] = False
+        request[drained] = 0
+
+        pending = ~was_active & (request != 0)
+        fire = pending & (now - request >= proto._boost_lag_ms) & (energy > 0)
+        active[fire] = True
+        a['_boost_start_time'][fire] = now
+        request[fire] = 0
+
+        recharge = ~was_active & ~pending
+        energy[recharge] = np.minimum(1.0, energy[recharge] + proto._boost_recharge_per_ms * dt[recharge])
+
+    def _resolve_car_contacts(self, now, grid=None):
+        n = self.count
+        if n < 2:
+            return
+        a = self._views()
+        proto = self.cars[0]
+        w = proto._hitbox.width
+        h = proto._hitbox.height
+        left = np.floor(a['_x'] + 0.5) - w // 2
+        top = np.floor(a['_y'] + 0.5) - h // 2
+        if grid is None:
+            overlap = (np.abs(left[:, None] - left[None, :]) < w) & (np.abs(top[:, None] - top[None, :]) < h)
+            np.fill_diagonal(overlap, False)
+            first, second = np.nonzero(overlap)
+        else:
+            first, second = grid.candidate_pairs(max(w, h) + 2 * proto._max_velocity)
+            keep = (np.abs(left[first] - left[second]) < w) & (np.abs(top[first] - top[second]) < h)
+            first = first[keep]
+            second = second[keep]
+        group = self._game._contact_group
+        if group:
+            same = first // group == second // group
+            first = first[same]
+            second = second[same]
+        if first.size == 0:
+            return
+
+        vel = a['_velocity']
+        steer = a['_steering_angle']
+        collision_end = a['_collision_end_time']
+        busy = self.in_collision(now)
+        for i, j in zip(first.tolist(), second.tolist()):
+            if busy[j]:
+                continue
+            vel[i] = -abs(vel[i]) * proto._recoil_factor
+            steer[i] = 0
+            collision_end[i] = now + 1000
+            vel[j] = 0
+            steer[j] = 0
+            collision_end[j] = now + 1000
+            busy[i] = True
+            busy[j] = True
@@ -0,0 +1,32 @@
+from collections.abc import Mapping
+
+OBS_FIELDS = (
+    'x', 'y', 'angle_degrees', 'steering_angle', 'speed',
+    'lap_progress', 'lap_number', 'current_lap_time', 'collided',
+)
+OBS_INDEX = {name: i for i, name in enumerate(OBS_FIELDS)}
+
+
+class Observation(Mapping):
+    def __init__(self, car, loaders):
+        self._car = car
+        self._loaders = loaders
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        value = self._loaders[key](self._car)
+        self._values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def __repr__(self):
+        return 'Observation(' + repr(dict(self)) + ')'
@@ -0,0 +1,56 @@
+import pygame
+from env.constants import SPRITE_ROTATION_STEPS
+
+CAR_SPRITE_SIZE = (12, 18)
+
+
+class SpriteAtlas:
+    # One per (image, size), shared by every car that uses it. Rotated
+    # frames are built on first use per (zoom, angle bucket) and then only
+    # looked up, so rendering a frame is just dictionary hits and blits.
+    _shared = {}
+
+    @classmethod
+    def get(cls, image_path, size=CAR_SPRITE_SIZE, steps=SPRITE_ROTATION_STEPS):
+        key = (str(image_path), tuple(size), steps)
+        atlas = cls._shared.get(key)
+        if atlas is None:
+            atlas = cls._shared[key] = cls(image_path, size, steps)
+        return atlas
+
+    def __init__(self, image_path, size=CAR_SPRITE_SIZE, steps=SPRITE_ROTATION_STEPS):
+        self.size = tuple(size)
+        self.steps = int(steps)
+        self._step_deg = 360.0 / self.steps
+        self._source = pygame.image.load(image_path)
+        self._scaled = {}
+        self._frames = {}
+        self._converted = False
+
+    def _base(self, scale):
+        base = self._scaled.get(scale)
+        if base is None:
+            w, h = self.size
+            base = self._scaled[scale] = pygame.transform.scale(self._source, (w * scale, h * scale))
+        return base
+
+    def frame(self, angle, scale=1):
+        # A display created after frames were cached would leave them in
+        # the slow pixel format, so drop them once one shows up.
+        if not self._converted and pygame.display.get_surface() is not None:
+            self._source = self._source.convert_alpha()
+            self._scaled.clear()
+            self._frames.clear()
+            self._converted = True
+        bucket = int(round(angle / self._step_deg)) % self.steps
+        key = (scale, bucket)
+        surface = self._frames.get(key)
+        if surface is None:
+            surface = pygame.transform.rotate(self._base(scale), -bucket * self._step_deg)
+            self._frames[key] = surface
+        return surface
+
+    def blit(self, screen, center, angle, scale=1):
+        surface = self.frame(angle, scale)
+        w, h = surface.get_size()
+        return screen.blit(surface, (int(center[0] - w / 2), int(center[1] - h / 2)))
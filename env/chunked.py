@@ -0,0 +1,176 @@
+import numpy as np
+
+
+class ChunkedGrid:
+    # A 2D grid kept as chunk x chunk blocks. A block that holds a single
+    # value throughout is stored as that value alone, so memory follows the
+    # parts of a track that actually change (walls, checkpoints, spawns)
+    # rather than its area. Reads go through one vectorized gather.
+    def __init__(self, shape, chunk, index, fill, blocks):
+        self.shape = tuple(int(v) for v in shape)
+        self.chunk = int(chunk)
+        self.index = index
+        self.fill = fill
+        self.blocks = blocks
+        self.dtype = blocks.dtype
+
+    @classmethod
+    def from_rows(cls, rows, chunk):
+        # rows: equal-length ASCII strings.
+        height = len(rows)
+        width = len(rows[0])
+
+        def bands():
+            for start in range(0, height, chunk):
+                part = rows[start:start + chunk]
+                if any(len(row) != width for row in part):
+                    raise ValueError("Track rows must all have the same length")
+                yield np.frombuffer(''.join(part).encode('ascii'), dtype=np.uint8).reshape(len(part), width)
+        return cls.from_bands((height, width), chunk, bands())
+
+    @classmethod
+    def from_bands(cls, shape, chunk, bands):
+        # bands: 2D arrays of `chunk` full-width rows each, top to bottom
+        # (the last may be shorter). Works one band at a time, so only the
+        # kept blocks outlive the band.
+        height, width = shape
+        ch = -(-height // chunk)
+        cw = -(-width // chunk)
+        index = np.full((ch, cw), -1, dtype=np.int32)
+        fill = None
+        kept = []
+        count = 0
+        for band, cells in enumerate(bands):
+            # Edge padding keeps uniform border chunks uniform.
+            cells = np.pad(cells, ((0, chunk - len(cells)), (0, cw * chunk - width)), mode='edge')
+            blocks = cells.reshape(chunk, cw, chunk).transpose(1, 0, 2)
+            first = blocks[:, 0, 0]
+            mixed = ~(blocks == first[:, None, None]).all(axis=(1, 2))
+            if fill is None:
+                fill = np.zeros((ch, cw), dtype=cells.dtype)
+            fill[band] = first
+            cols = np.flatnonzero(mixed)
+            index[band, cols] = np.arange(count, count + cols.size, dtype=np.int32)
+            count += cols.size
+            kept.append(np.ascontiguousarray(blocks[cols]))
+        if fill is None:
+            fill = np.zeros((ch, cw), dtype=np.uint8)
+        blocks = np.concatenate(kept) if kept else np.zeros((0, chunk, chunk), dtype=fill.dtype)
+        return cls((height, width), chunk, index, fill, blocks)
+
+    @classmethod
+    def from_cells(cls, shape, chunk, ys, xs, values, fill):
+        # values at (ys, xs) and fill everywhere else; only chunks holding at
+        # least one of the cells get a block. values may carry trailing
+        # dimensions, which every read then returns per cell.
+        values = np.asarray(values)
+        ch = -(-shape[0] // chunk)
+        cw = -(-shape[1] // chunk)
+        ys = np.asarray(ys, dtype=np.intp)
+        xs = np.asarray(xs, dtype=np.intp)
+        used, which = np.unique((ys // chunk) * cw + xs // chunk, return_inverse=True)
+        index = np.full(ch * cw, -1, dtype=np.int32)
+        index[used] = np.arange(used.size, dtype=np.int32)
+        fills = np.empty((ch, cw) + values.shape[1:], dtype=values.dtype)
+        fills[...] = fill
+        blocks = np.empty((used.size, chunk, chunk) + values.shape[1:], dtype=values.dtype)
+        blocks[...] = fill
+        blocks[which, ys % chunk, xs % chunk] = values
+        return cls(shape, chunk, index.reshape(ch, cw), fills, blocks)
+
+    def map(self, lut):
+        # Same layout with every value v replaced by lut[v].
+        lut = np.asarray(lut)
+        return ChunkedGrid(self.shape, self.chunk, self.index, lut[self.fill], lut[self.blocks])
+
+    def take(self, ys, xs):
+        ys = np.asarray(ys, dtype=np.intp)
+        xs = np.asarray(xs, dtype=np.intp)
+        ys, xs = np.broadcast_arrays(ys, xs)
+        cy = ys // self.chunk
+        cx = xs // self.chunk
+        out = self.fill[cy, cx]
+        block = self.index[cy, cx]
+        mixed = block >= 0
+        if mixed.any():
+            out[mixed] = self.blocks[block[mixed], ys[mixed] % self.chunk, xs[mixed] % self.chunk]
+        return out
+
+    def rows(self, start, stop):
+        # Dense copy of rows start..stop, full width.
+        return self.take(np.arange(start, stop)[:, None], np.arange(self.shape[1])[None, :])
+
+    def __getitem__(self, key):
+        ys, xs = key
+        if np.ndim(ys) == 0 and np.ndim(xs) == 0:
+            c = self.chunk
+            block = self.index[ys // c, xs // c]
+            if block < 0:
+                return self.fill[ys // c, xs // c]
+            return self.blocks[block, ys % c, xs % c]
+        return self.take(ys, xs)
+
+    def where(self, predicate):
+        # (ys, xs, values) of every cell where predicate(values) holds, in
+        # row-major order, without expanding uniform chunks that fail it.
+        c = self.chunk
+        found_y, found_x, found_v = [], [], []
+        if self.blocks.size:
+            b, ly, lx = np.nonzero(predicate(self.blocks))
+            by, bx = np.nonzero(self.index >= 0)
+            order = self.index[by, bx]
+            pos_y = np.empty(len(self.blocks), dtype=np.intp)
+            pos_x = np.empty(len(self.blocks), dtype=np.intp)
+            pos_y[order] = by
+            pos_x[order] = bx
+            found_y.append(pos_y[b] * c + ly)
+            found_x.append(pos_x[b] * c + lx)
+            found_v.append(self.blocks[b, ly, lx])
+        for by, bx in zip(*np.nonzero((self.index < 0) & predicate(self.fill))):
+            ly, lx = np.indices((c, c)).reshape(2, -1)
+            found_y.append(by * c + ly)
+            found_x.append(bx * c + lx)
+            found_v.append(np.full(c * c, self.fill[by, bx]))
+        if not found_y:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, np.zeros(0, dtype=self.dtype)
+        ys = np.concatenate(found_y)
+        xs = np.concatenate(found_x)
+        vs = np.concatenate(found_v)
+        inside = (ys < self.shape[0]) & (xs < self.shape[1])
+        ys, xs, vs = ys[inside], xs[inside], vs[inside]
+        order = np.lexsort((xs, ys))
+        return ys[order], xs[order], vs[order]
+
+    def __array__(self, dtype=None, copy=None):
+        # Dense copy, for the whole-board passes that need one. Built block
+        # by block, so it costs the output array and nothing more.
+        c = self.chunk
+        ch, cw = self.index.shape
+        tail = self.blocks.shape[3:]
+        out = np.empty((ch, c, cw, c) + tail, dtype=self.dtype)
+        out[...] = self.fill[:, None, :, None]
+        by, bx = np.nonzero(self.index >= 0)
+        # Assigning through the (ch, cw, c, c) view writes into out.
+        view = out.transpose((0, 2, 1, 3) + tuple(range(4, 4 + len(tail))))
+        view[by, bx] = self.blocks[self.index[by, bx]]
+        out = out.reshape((ch * c, cw * c) + tail)[:self.shape[0], :self.shape[1]]
+        return out.astype(dtype) if dtype is not None else out
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.fill.nbytes + self.blocks.nbytes
+
+    def arrays(self, prefix):
+        return {
+            prefix + '_index': self.index,
+            prefix + '_fill': self.fill,
+            prefix + '_blocks': self.blocks,
+            prefix + '_shape': np.array(self.shape + (self.chunk,), dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        height, width, chunk = arrays[prefix + '_shape'].tolist()
+        return cls((height, width), chunk, arrays[prefix + '_index'], arrays[prefix + '_fill'],
+                   arrays[prefix + '_blocks'])
@@ -0,0 +1,24 @@
+import pygame
+
+
+class WallClock:
+    def get_ticks(self):
+        return pygame.time.get_ticks()
+
+    def advance(self):
+        pass
+
+
+class SimClock:
+    def __init__(self, dt_ms=1000.0 / 60.0):
+        self.dt_ms = float(dt_ms)
+        self._ticks = 0.0
+
+    def get_ticks(self):
+        return self._ticks
+
+    def advance(self):
+        self._ticks += self.dt_ms
+
+    def set_ticks(self, ticks):
+        self._ticks = float(ticks)
@@ -1,2 +1,10 @@
 CELL_SIZE = 6
 CAR_GAP = 15
+RASTER_TILE_SIZE = 256
+GRID_CELL_SIZE = 32
+NEIGHBOR_RADIUS = 150
+RAY_ANGLES = (-90, -45, -20, 0, 20, 45, 90)
+RAY_MAX_RANGE = 300
+SPRITE_ROTATION_STEPS = 120
+LARGE_TRACK_CELLS = 1000000
+TRACK_CHUNK_SIZE = 64
@@ -1,3 +1,10 @@
+CONTROL_FORWARD = 1
+CONTROL_BACK = 2
+CONTROL_LEFT = 4
+CONTROL_RIGHT = 8
+CONTROL_BRAKE = 16
+CONTROL_BOOST = 32
+CONTROL_RESET = 64
 def forward(car):
     car.accelerate_fwd()
 def back(car):
@@ -12,3 +19,37 @@ def boost(car):
     car.request_boost()
 def reset(car):
     car.reset()
+def apply_action(car, action_idx):
+    if action_idx == 1:
+        forward(car)
+    elif action_idx == 2:
+        forward(car)
+        steer_left(car)
+    elif action_idx == 3:
+        forward(car)
+        steer_right(car)
+    elif action_idx == 4:
+        back(car)
+    elif action_idx == 5:
+        brake(car)
+    elif action_idx == 6:
+        forward(car)
+        boost(car)
+def batched(func):
+    func.batched = True
+    return func
+def apply_controls(car, bits):
+    if bits & CONTROL_RESET:
+        reset(car)
+    if bits & CONTROL_FORWARD:
+        forward(car)
+    if bits & CONTROL_BACK:
+        back(car)
+    if bits & CONTROL_LEFT:
+        steer_left(car)
+    if bits & CONTROL_RIGHT:
+        steer_right(car)
+    if bits & CONTROL_BOOST:
+        boost(car)
+    if bits & CONTROL_BRAKE:
+        brake(car)
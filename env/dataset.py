@@ -0,0 +1,273 @@
+import importlib
+import json
+import multiprocessing as mp
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from car.observation import OBS_FIELDS, OBS_INDEX
+from env.controls import apply_action
+
+NUM_ACTIONS = 7
+FEATURE_SIZE = 12
+# Same layout DrivingPolicy is fed in models/final_model/model.py; the
+# remaining inputs are zero.
+FEATURE_FIELDS = ('x', 'y', 'speed', 'angle_degrees', 'steering_angle', 'lap_progress')
+_FEATURE_COLUMNS = [OBS_INDEX[name] for name in FEATURE_FIELDS]
+
+# name -> (dtype, per-row shape)
+COLUMNS = {
+    'features': (np.float32, (FEATURE_SIZE,)),
+    'obs': (np.float32, (len(OBS_FIELDS),)),
+    'action': (np.int8, ()),
+    'next_obs': (np.float32, (len(OBS_FIELDS),)),
+    'lap_progress': (np.float32, ()),
+    'done': (np.bool_, ()),
+    'episode': (np.int32, ()),
+    'car': (np.int16, ()),
+    'step': (np.int32, ()),
+}
+
+
+def features(obs_rows):
+    out = np.zeros((len(obs_rows), FEATURE_SIZE), dtype=np.float32)
+    out[:, :len(_FEATURE_COLUMNS)] = obs_rows[:, _FEATURE_COLUMNS]
+    return out
+
+
+class RandomBehaviour:
+    # Uniform over action indices, with each car holding its action for a
+    # few ticks so rollouts actually go somewhere.
+    def __init__(self, hold=8):
+        self.hold = hold
+        self._actions = None
+
+    def reset(self):
+        self._actions = None
+
+    def __call__(self, obs_rows, step, rng):
+        if self._actions is None or len(self._actions) != len(obs_rows):
+            self._actions = rng.integers(0, NUM_ACTIONS, len(obs_rows))
+        change = rng.random(len(obs_rows)) < 1.0 / self.hold
+        self._actions[change] = rng.integers(0, NUM_ACTIONS, int(change.sum()))
+        return self._actions
+
+
+class ModelBehaviour:
+    # Wraps a batched model (batch_model) with epsilon-random exploration.
+    # Models keep module-level state (final_model counts steps from load),
+    # so each episode starts from a freshly loaded copy.
+    def __init__(self, model_dir, epsilon=0.1):
+        self.model_dir = model_dir
+        self.epsilon = float(epsilon)
+        self.reset()
+
+    def reset(self):
+        from env.loading import load_model
+        self.func, _ = load_model(self.model_dir)
+        if not getattr(self.func, 'batched', False):
+            raise ValueError(str(self.model_dir) + " has no batch_model")
+
+    def __call__(self, obs_rows, step, rng):
+        actions = np.asarray(self.func(obs_rows), dtype=np.int64).copy()
+        explore = rng.random(len(actions)) < self.epsilon
+        actions[explore] = rng.integers(0, NUM_ACTIONS, int(explore.sum()))
+        return actions
+
+
+def make_behaviour(spec):
+    # "random", "model:DIR[:EPSILON]" or "package.module:callable" returning
+    # a behaviour when called with no arguments. A behaviour's reset(), if
+    # it has one, is called at the start of every episode.
+    if spec == 'random':
+        return RandomBehaviour()
+    if spec.startswith('model:'):
+        _, _, rest = spec.partition(':')
+        path, _, eps = rest.partition(':')
+        return ModelBehaviour(path, float(eps) if eps else 0.1)
+    module, _, attr = spec.partition(':')
+    return getattr(importlib.import_module(module), attr)()
+
+
+class ShardWriter:
+    # Fills one chunk of memory-mapped .npy columns at a time, so a worker
+    # never holds more than chunk_rows rows. Finished shards are written to
+    # a temporary directory and renamed into place.
+    def __init__(self, root, prefix, chunk_rows):
+        self.root = Path(root)
+        self.prefix = prefix
+        self.chunk_rows = int(chunk_rows)
+        self.shards = []
+        self._index = 0
+        self._cols = None
+        self._rows = 0
+        self._tmp = None
+
+    def _open(self):
+        self._tmp = self.root / (f"{self.prefix}-{self._index:05d}.tmp")
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        self._cols = {}
+        for name, (dtype, shape) in COLUMNS.items():
+            self._cols[name] = np.lib.format.open_memmap(
+                self._tmp / (name + '.npy'), mode='w+', dtype=dtype, shape=(self.chunk_rows,) + shape)
+        self._rows = 0
+
+    def write(self, rows):
+        n = len(rows['action'])
+        start = 0
+        while start < n:
+            if self._cols is None:
+                self._open()
+            take = min(n - start, self.chunk_rows - self._rows)
+            for name, col in self._cols.items():
+                col[self._rows:self._rows + take] = rows[name][start:start + take]
+            self._rows += take
+            start += take
+            if self._rows == self.chunk_rows:
+                self._finish()
+
+    def _finish(self):
+        rows = self._rows
+        cols, self._cols = self._cols, None
+        partial = {}
+        for name, col in cols.items():
+            col.flush()
+            if rows < self.chunk_rows:
+                partial[name] = np.array(col[:rows])
+        # A short last chunk is rewritten at its real length, which must not
+        # happen while the files are still mapped.
+        del cols, col
+        for name, data in partial.items():
+            np.save(self._tmp / (name + '.npy'), data)
+        (self._tmp / 'meta.json').write_text(json.dumps({'rows': rows}))
+        final = self._tmp.with_suffix('')
+        if final.exists():
+            shutil.rmtree(final)
+        os.replace(self._tmp, final)
+        self.shards.append({'name': final.name, 'rows': rows})
+        self._index += 1
+
+    def close(self):
+        if self._cols is not None:
+            if self._rows:
+                self._finish()
+            else:
+                self._cols = None
+                shutil.rmtree(self._tmp)
+        return self.shards
+
+
+def _rollout_worker(worker, root, behaviour_spec, episodes, cars, max_steps, laps, chunk_rows, seed, track_path):
+    from env.game import F1Game
+    from env.track import Track
+
+    rng = np.random.default_rng([seed, worker])
+    behaviour = make_behaviour(behaviour_spec)
+    track = Track.from_file(track_path) if track_path else None
+    game = F1Game(model_dirs=[str(i) for i in range(cars)], headless=True, fixed_dt_ms=1000.0 / 60.0,
+                  vectorized=True, track=track)
+    writer = ShardWriter(root, f"shard-{worker:03d}", chunk_rows)
+    car_ids = np.arange(cars, dtype=np.int16)
+    lap_col = OBS_INDEX['lap_progress']
+    reset = getattr(behaviour, 'reset', None)
+    for episode in range(episodes):
+        game.reset()
+        if reset is not None:
+            reset()
+        episode_id = worker * episodes + episode
+        obs = game.observations().copy()
+        for step in range(max_steps):
+            actions = np.asarray(behaviour(obs, step, rng), dtype=np.int64)
+            for car, action in zip(game._cars, actions.tolist()):
+                apply_action(car, action)
+            game.step()
+            next_obs = game.observations().copy()
+            finished = bool((game._laps_completed >= laps).all())
+            done = step == max_steps - 1 or finished
+            writer.write({
+                'features': features(obs),
+                'obs': obs,
+                'action': actions,
+                'next_obs': next_obs,
+                'lap_progress': game._laps_completed + next_obs[:, lap_col],
+                'done': np.full(cars, done),
+                'episode': np.full(cars, episode_id, dtype=np.int32),
+                'car': car_ids,
+                'step': np.full(cars, step, dtype=np.int32),
+            })
+            obs = next_obs
+            if done:
+                break
+    return writer.close()
+
+
+def generate(root, behaviour='random', workers=2, episodes_per_worker=4, cars=16, max_steps=1800,
+             laps=1, chunk_rows=65536, seed=0, track_path=None):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    args = [(w, str(root), behaviour, episodes_per_worker, cars, max_steps, laps, chunk_rows, seed, track_path)
+            for w in range(workers)]
+    with ctx.Pool(workers) as pool:
+        shards = [s for result in pool.starmap(_rollout_worker, args) for s in result]
+    manifest = {
+        'columns': {name: {'dtype': np.dtype(dtype).str, 'shape': list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+        'obs_fields': list(OBS_FIELDS),
+        'feature_fields': list(FEATURE_FIELDS),
+        'behaviour': behaviour,
+        'shards': shards,
+        'rows': sum(s['rows'] for s in shards),
+    }
+    (root / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+class Dataset:
+    # Read side. Shards are memory-mapped on demand; batches() walks them in
+    # (optionally shuffled) order and shuffles rows within each shard, so
+    # memory stays around one batch regardless of dataset size.
+    def __init__(self, root):
+        self.root = Path(root)
+        manifest = self.root / 'manifest.json'
+        if manifest.exists():
+            self.shards = json.loads(manifest.read_text())['shards']
+        else:
+            self.shards = [{'name': p.name, 'rows': json.loads((p / 'meta.json').read_text())['rows']}
+                           for p in sorted(self.root.glob('shard-*')) if (p / 'meta.json').exists()]
+        self.rows = sum(s['rows'] for s in self.shards)
+
+    def __len__(self):
+        return self.rows
+
+    def shard(self, i, columns=None):
+        path = self.root / self.shards[i]['name']
+        return {name: np.load(path / (name + '.npy'), mmap_mode='r') for name in (columns or COLUMNS)}
+
+    def batches(self, batch_size, columns=None, shuffle=True, seed=0, drop_last=False):
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.shards)) if shuffle else np.arange(len(self.shards))
+        carry = None
+        for i in order.tolist():
+            cols = self.shard(i, columns)
+            n = self.shards[i]['rows']
+            idx = rng.permutation(n) if shuffle else np.arange(n)
+            start = 0
+            if carry is not None:
+                need = batch_size - len(carry[next(iter(carry))])
+                take = idx[:need]
+                carry = {k: np.concatenate((v, cols[k][np.sort(take)])) for k, v in carry.items()}
+                start = len(take)
+                if len(carry[next(iter(carry))]) < batch_size:
+                    continue
+                yield carry
+                carry = None
+            for s in range(start, n, batch_size):
+                take = np.sort(idx[s:s + batch_size])
+                batch = {k: np.asarray(v[take]) for k, v in cols.items()}
+                if len(take) < batch_size:
+                    carry = batch
+                    break
+                yield batch
+        if carry is not None and not drop_last:
+            yield carry
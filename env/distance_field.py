@@ -0,0 +1,244 @@
+import math
+import numpy as np
+from env.chunked import ChunkedGrid
+from env.constants import CELL_SIZE
+
+_STRAIGHT = ((-1, 0), (1, 0), (0, -1), (0, 1))
+_DIAGONAL = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+_MOVES = tuple((dy, dx, np.float32(math.hypot(dx, dy))) for dy, dx in _STRAIGHT + _DIAGONAL)
+
+
+def _unique(cells, stamp):
+    # One copy of each cell, without sorting: whichever slot a repeated
+    # cell's stamp ends up holding is the copy kept. stamp is a scratch
+    # int32 array as large as the board.
+    slots = np.arange(cells.size, dtype=np.int32)
+    stamp[cells] = slots
+    return cells[stamp[cells] == slots]
+
+
+class DistanceField:
+    # Per checkpoint n: the driving distance to n over the two segments
+    # either side of it, the lap fraction that gives, and the unit step
+    # towards n. Only the cells the search reaches are filled in. Dense
+    # tracks keep (K, H, W) arrays; chunked tracks keep ChunkedGrids with
+    # the K fields stacked row-wise, so memory follows the road, not the
+    # board area.
+    def __init__(self, track):
+        self.height = track.height
+        self.width = track.width
+        self.checkpoint_ids = list(track.checkpoint_ids)
+        self.num_checkpoints = track.num_checkpoints
+        self._index = {cid: n for n, cid in enumerate(self.checkpoint_ids)}
+        self.chunk = track.chunk
+        # Rows between the starts of consecutive fields in the stacked
+        # layout; chunked fields are padded so no chunk spans two of them.
+        self._stride = -(-self.height // self.chunk) * self.chunk if self.chunk else self.height
+        self.segment_lengths = np.zeros(self.num_checkpoints, dtype=np.float64)
+        fields = self._build(track) if self.num_checkpoints else []
+        self._store(fields)
+
+    def _flat(self, track, n):
+        cells = np.array(track.checkpoints[self.checkpoint_ids[n % self.num_checkpoints]], dtype=np.intp)
+        return cells[:, 1] * self.width + cells[:, 0]
+
+    def _step(self, free, ys, xs, dy, dx):
+        # Which cells can move by (dy, dx): the target must be on the board
+        # and drivable, and a diagonal also needs both cells it cuts past.
+        # free is the flat drivable mask.
+        w = self.width
+        ny = ys + dy
+        nx = xs + dx
+        ok = (ny >= 0) & (ny < self.height) & (nx >= 0) & (nx < w)
+        target = ny * w + nx
+        ok[ok] = free[target[ok]]
+        if dy and dx:
+            ok[ok] = free[ys[ok] * w + nx[ok]] & free[ny[ok] * w + xs[ok]]
+        return ok, target
+
+    def _build(self, track):
+        k = self.num_checkpoints
+        free = ~np.asarray(track.collision_mask, dtype=bool).reshape(-1)
+        # Flat scratch arrays serve every search; each search only touches
+        # the cells it reaches and puts them back afterwards.
+        dist = np.full(free.size, np.inf, dtype=np.float32)
+        stop = np.zeros(free.size, dtype=bool)
+        seen = np.zeros(free.size, dtype=bool)
+        stamp = np.empty(free.size, dtype=np.int32)
+        fields = []
+        for n in range(k):
+            start = self._flat(track, n)
+            start = _unique(start[free[start]], stamp)
+            # The previous and following checkpoints absorb the wave, so it
+            # only covers the segments either side of n instead of running
+            # all the way round the lap.
+            barrier = []
+            if k > 1:
+                barrier.append(self._flat(track, n - 1))
+            if k > 2:
+                barrier.append(self._flat(track, n + 1))
+            barrier = np.concatenate(barrier) if barrier else start[:0]
+            stop[barrier] = True
+            stop[start] = False
+
+            reached = self._search(dist, start, stop, seen, stamp, free)
+            cells, direction = self._directions(dist, reached, seen, free)
+            prev = dist[self._flat(track, n - 1)] * CELL_SIZE
+            prev = prev[np.isfinite(prev)]
+            self.segment_lengths[n] = float(np.median(prev)) if prev.size else 0.0
+            fields.append((cells, dist[cells] * CELL_SIZE, direction))
+            dist[reached] = np.inf
+            seen[cells] = False
+            stop[barrier] = False
+        return fields
+
+    def _search(self, dist, start, stop, seen, stamp, free):
+        # Dijkstra with buckets one cell wide: every move costs at least one
+        # cell, so cells within one of the nearest pending cell cannot
+        # improve each other and are expanded together, once each. Only
+        # pending cells are touched. Cells marked in stop take a distance
+        # but pass nothing on. Returns every cell reached, marked in seen.
+        dist[start] = 0.0
+        seen[start] = True
+        reached = [start]
+        pending = start
+        while pending.size:
+            d = dist[pending]
+            now = d < d.min() + 1.0
+            src = pending[now]
+            pending = pending[~now]
+            src = src[~stop[src]]
+            ys, xs = np.divmod(src, self.width)
+            d = dist[src]
+            cells = []
+            cands = []
+            for dy, dx, cost in _MOVES:
+                ok, target = self._step(free, ys, xs, dy, dx)
+                cells.append(target[ok])
+                cands.append(d[ok] + cost)
+            cells = np.concatenate(cells)
+            cands = np.concatenate(cands)
+            better = cands < dist[cells]
+            cells = cells[better]
+            np.minimum.at(dist, cells, cands[better])
+            new = _unique(cells[~seen[cells]], stamp)
+            seen[new] = True
+            reached.append(new)
+            pending = _unique(np.concatenate((pending, cells)), stamp)
+        return np.concatenate(reached)
+
+    def _directions(self, dist, reached, seen, free):
+        # Each cell steps towards the neighbour with the lowest distance plus
+        # move cost, if that beats its own distance. Only the reached cells
+        # and their neighbours can have one.
+        ys, xs = np.divmod(reached, self.width)
+        around = [reached]
+        for dy, dx, _ in _MOVES:
+            ok, target = self._step(free, ys, xs, dy, dx)
+            # One move maps distinct cells to distinct cells, so seen is
+            # enough to keep repeats out.
+            target = target[ok]
+            new = target[~seen[target]]
+            seen[new] = True
+            around.append(new)
+        cells = np.concatenate(around)
+
+        ys, xs = np.divmod(cells, self.width)
+        best = dist[cells] * CELL_SIZE
+        direction = np.zeros((cells.size, 2), dtype=np.float32)
+        for dy, dx, cost in _MOVES:
+            ok, target = self._step(free, ys, xs, dy, dx)
+            cand = np.full(cells.size, np.inf, dtype=np.float32)
+            cand[ok] = dist[target[ok]] * CELL_SIZE + cost
+            better = cand < best
+            best[better] = cand[better]
+            norm = math.hypot(dx, dy)
+            direction[better] = (dx / norm, dy / norm)
+        return cells, direction
+
+    def _store(self, fields):
+        k, h, w = self.num_checkpoints, self.height, self.width
+        lap = self.segment_lengths.sum()
+        before = np.concatenate(([0.0], np.cumsum(self.segment_lengths)[:-1]))
+        progress = []
+        for n, (cells, d, _) in enumerate(fields):
+            p = np.full(cells.size, np.nan, dtype=np.float32)
+            if lap > 0:
+                along = before[n] + np.clip(self.segment_lengths[n] - d, 0.0, self.segment_lengths[n])
+                p[:] = np.where(np.isfinite(d), along / lap, np.nan)
+            progress.append(p)
+
+        if self.chunk is None:
+            self.distance = np.full((k, h, w), np.inf, dtype=np.float32)
+            self.progress = np.full((k, h, w), np.nan, dtype=np.float32)
+            self.direction = np.zeros((k, h, w, 2), dtype=np.float32)
+            for n, (cells, d, direction) in enumerate(fields):
+                self.distance.reshape(k, h * w)[n, cells] = d
+                self.progress.reshape(k, h * w)[n, cells] = progress[n]
+                self.direction.reshape(k, h * w, 2)[n, cells] = direction
+            # Views in the stacked (K * H, W) layout the lookups use.
+            self._distance = self.distance.reshape(k * h, w)
+            self._progress = self.progress.reshape(k * h, w)
+            self._direction = self.direction.reshape(k * h, w, 2)
+            return
+
+        rows = [n * self._stride + cells // w for n, (cells, _, _) in enumerate(fields)]
+        cols = [cells % w for cells, _, _ in fields]
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+        shape = (k * self._stride, w)
+
+        def grid(values, fill, dtype, tail=()):
+            values = np.concatenate(values) if values else np.zeros((0,) + tail, dtype=dtype)
+            return ChunkedGrid.from_cells(shape, self.chunk, rows, cols, values.astype(dtype), fill)
+
+        self.distance = self._distance = grid([d for _, d, _ in fields], np.inf, np.float32)
+        self.progress = self._progress = grid(progress, np.nan, np.float32)
+        self.direction = self._direction = grid([d for _, _, d in fields], 0.0, np.float32, (2,))
+
+    @property
+    def nbytes(self):
+        return self.distance.nbytes + self.progress.nbytes + self.direction.nbytes
+
+    def _lookup(self, next_id, x, y):
+        n = self._index.get(next_id)
+        gx = int(x // CELL_SIZE)
+        gy = int(y // CELL_SIZE)
+        if n is None or gx < 0 or gx >= self.width or gy < 0 or gy >= self.height:
+            return None
+        return n * self._stride + gy, gx
+
+    def lap_progress(self, next_id, x, y):
+        key = self._lookup(next_id, x, y)
+        if key is None or math.isnan(self._progress[key]):
+            n = self._index.get(next_id, 0)
+            return float(n) / float(max(1, self.num_checkpoints))
+        return float(self._progress[key])
+
+    def lap_progress_many(self, next_ids, xs, ys):
+        next_ids = np.asarray(next_ids, dtype=np.intp)
+        n = np.searchsorted(self.checkpoint_ids, next_ids)
+        n = np.clip(n, 0, max(0, self.num_checkpoints - 1))
+        gx = np.floor(np.asarray(xs) / CELL_SIZE).astype(np.intp)
+        gy = np.floor(np.asarray(ys) / CELL_SIZE).astype(np.intp)
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        result = n / float(max(1, self.num_checkpoints))
+        if self.num_checkpoints:
+            value = self._progress[n[inside] * self._stride + gy[inside], gx[inside]]
+            result[np.flatnonzero(inside)[~np.isnan(value)]] = value[~np.isnan(value)]
+        return result
+
+    def distance_to(self, next_id, x, y):
+        key = self._lookup(next_id, x, y)
+        if key is None:
+            return math.inf
+        return float(self._distance[key])
+
+    def heading(self, next_id, x, y):
+        key = self._lookup(next_id, x, y)
+        if key is None:
+            return None
+        dx, dy = self._direction[key]
+        if dx == 0 and dy == 0:
+            return None
+        return math.degrees(math.atan2(dx, -dy))
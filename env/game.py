@@ -1,28 +1,60 @@
 import pygame
 import sys
 from env.track import Track
-from env.constants import CAR_GAP, CELL_SIZE
+from env.constants import CAR_GAP, CELL_SIZE, GRID_CELL_SIZE, NEIGHBOR_RADIUS
 from car.car import Car
+from car.fleet import Fleet
+from car.observation import OBS_FIELDS, OBS_INDEX
 from env.camera import Camera
-import os
+from env.clock import SimClock, WallClock
+from env.spatial import SpatialHash
+from env.controls import apply_action, apply_controls
+from env.recording import RaceRecorder
+from env.profiler import FrameProfiler
+from env.telemetry import TelemetryPublisher, open_sink
+from env.snapshot import Forker, capture, restore
+import math
+import time
+import numpy as np
 
 class F1Game:
-    def __init__(self, model_dirs=None):
-        pygame.init()
-        self._track = Track()
-        info = pygame.display.Info()
-        self._screen_width = info.current_w
-        self._screen_height = info.current_h
-        self._screen = pygame.display.set_mode((self._screen_width, self._screen_height))
-        pygame.display.set_caption("F1 Racing Environment")
-
-        self._clock = pygame.time.Clock()
+    def __init__(self, model_dirs=None, headless=False, fixed_dt_ms=None, vectorized=False, track=None,
+                 render_fps=None):
+        self._headless = headless
+        self._track = track if track is not None else Track()
         self._fps = 60
+        self._render_interval = 1.0 / (render_fps if render_fps else self._fps)
+        self._next_render = 0.0
+        self._background = None
+        self._background_key = None
+        self._car_rects = []
+        self._hud_font = None
+        self._hud_lines = []
+        self._overlay_rect = None
+        if headless:
+            self._screen_width = self._track.width * CELL_SIZE
+            self._screen_height = self._track.height * CELL_SIZE
+            self._screen = None
+            self._clock = None
+            if fixed_dt_ms is None:
+                fixed_dt_ms = 1000.0 / self._fps
+        else:
+            pygame.init()
+            info = pygame.display.Info()
+            self._screen_width = info.current_w
+            self._screen_height = info.current_h
+            self._screen = pygame.display.set_mode((self._screen_width, self._screen_height))
+            pygame.display.set_caption("F1 Racing Environment")
+            self._clock = pygame.time.Clock()
+
+        if fixed_dt_ms is None:
+            self._sim_clock = WallClock()
+        else:
+            self._sim_clock = SimClock(fixed_dt_ms)
 
         self._cars = []
-        if model_dirs is None:
-            model_dirs = [d for d in os.listdir('models') if os.path.isdir(os.path.join('models', d))]
-        self._model_dirs = list(model_dirs)
+        self._model_dirs = list(model_dirs) if model_dirs is not None else []
+        self._fleet = Fleet(self, self._track, len(self._model_dirs)) if vectorized else None
 
         spawn_positions = self._track.get_start_positions()
         for idx, model_dir in enumerate(self._model_dirs):
@@ -35,9 +67,18 @@ class F1Game:
                     sx = sx + (idx * CAR_GAP)
                 else:
                     sx, sy = (0, 0)
-            car = Car(sx, sy, "assets/car.png", idx, sx, sy, self, self._track)
+            if self._fleet is not None:
+                car = self._fleet.add_car(sx, sy, "assets/car.png", idx, sx, sy)
+            else:
+                car = Car(sx, sy, "assets/car.png", idx, sx, sy, self, self._track)
             self._cars.append(car)
 
+        self._grid = SpatialHash(GRID_CELL_SIZE)
+        # When set, only cars with the same index // group touch each other.
+        self._contact_group = None
+        self._grid_slack = 2 * self._cars[0]._max_velocity if self._cars else 0
+        self._rebuild_grid()
+
         world_w = self._track.width * CELL_SIZE
         world_h = self._track.height * CELL_SIZE
 
@@ -50,84 +91,416 @@ class F1Game:
         self._camera.offset_x = 0
         self._camera.offset_y = 0
 
-        self._checkpoints_collected = {}
-        self._laps_completed = {}
-        self._lap_start_time = {}
-        self._lap_times = {}
-        self._next_checkpoint = {}
-        for idx, model in enumerate(self._model_dirs):
-            self._checkpoints_collected[idx] = set()
-            self._laps_completed[idx] = 0
-            self._lap_start_time[idx] = pygame.time.get_ticks()
-            self._lap_times[idx] = []
-            self._next_checkpoint[idx] = 1
+        n = len(self._cars)
+        self._checkpoint_ids = np.array(self._track.checkpoint_ids, dtype=np.int16)
+        self._checkpoints_collected = np.zeros(n, dtype=np.int64)
+        self._laps_completed = np.zeros(n, dtype=np.int64)
+        self._lap_start_time = np.full(n, self.get_ticks(), dtype=np.float64)
+        self._lap_times = [[] for _ in range(n)]
+        self._last_lap_time = np.full(n, np.nan, dtype=np.float64)
+        self._next_checkpoint = np.full(n, self._checkpoint_ids[0] if n and len(self._checkpoint_ids) else -1, dtype=np.int16)
         self._running = True
-        
+        self._steps = 0
+        self._obs_buffer = np.zeros((len(self._cars), len(OBS_FIELDS)), dtype=np.float32)
+        self._obs_buffer.flags.writeable = False
+        self._obs_buffer_tick = -1
+        self._obs_version = 0
+        self._rays = None
+        self._rays_tick = -1
+        self._grid_dirty = False
+        self._recorder = None
+        self._telemetry = None
+        self._forker = None
+        self._profiler = FrameProfiler()
+        self._controller_keys = ['controller/' + str(idx) + ':' + str(name) for idx, name in enumerate(self._model_dirs)]
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    def set_profiling(self, enabled, overlay=None):
+        self._profiler.enabled = enabled
+        if overlay is not None:
+            self._profiler.overlay = overlay
+
+    def get_ticks(self):
+        return self._sim_clock.get_ticks()
+
+    def reset(self):
+        for car in self._cars:
+            car.reset()
+            car._rev = 0.0
+            car._accelerating = False
+            car._boost_energy = 1.0
+            car._boost_active = False
+            car._boost_request_time = 0
+            car._last_time = self.get_ticks()
+            car._controls = 0
+        self._checkpoints_collected[:] = 0
+        self._laps_completed[:] = 0
+        self._lap_start_time[:] = self.get_ticks()
+        self._lap_times = [[] for _ in self._cars]
+        self._last_lap_time[:] = np.nan
+        if len(self._checkpoint_ids):
+            self._next_checkpoint[:] = self._checkpoint_ids[0]
+        self._steps = 0
+        self._obs_buffer_tick = -1
+        self._rays_tick = -1
+        self._rebuild_grid()
+
     def step(self):
+        self._sim_clock.advance()
+        self._steps += 1
+        self._rebuild_grid()
+        if self._fleet is not None:
+            self._fleet.step(self._grid)
+        if self._fleet is None:
+            for idx, car in enumerate(self._cars):
+                car.update(self._contact_candidates(idx))
+        self._update_checkpoints()
+        if self._recorder is not None:
+            self._recorder.capture(self)
+        if self._telemetry is not None:
+            self._telemetry.publish(self)
+        # The CONTROL_* bits record what was applied during one tick, so
+        # the next tick's controls start from none.
+        self._clear_controls()
+
+    def snapshot(self):
+        return capture(self)
+
+    def restore(self, snap):
+        restore(self, snap)
+
+    def fork(self, actions, car=None, others=None, snap=None):
+        # Plays len(actions) candidate action sequences forward from snap
+        # (default: now) without touching this game; see Forker.run.
+        snap = snap if snap is not None else capture(self)
+        branches = len(actions)
+        forker = self._forker
+        if forker is None or forker.branches != branches:
+            clock = self._sim_clock
+            dt_ms = clock.dt_ms if isinstance(clock, SimClock) else 1000.0 / self._fps
+            forker = self._forker = Forker(self._track, len(self._cars), branches, dt_ms,
+                                           self._fleet is not None)
+        return forker.run(snap, actions, car, others)
+
+    def start_telemetry(self, sinks, capacity=1024, interval=0.05):
+        # sinks are sink objects or spec strings for open_sink, e.g.
+        # "ndjson:run.ndjson", "columnar:run_telemetry", "tcp:localhost:9000".
+        self.stop_telemetry()
+        sinks = [open_sink(s) if isinstance(s, str) else s for s in sinks]
+        self._telemetry = TelemetryPublisher(len(self._cars), sinks, capacity, interval)
+        return self._telemetry
+
+    def stop_telemetry(self):
+        if self._telemetry is not None:
+            self._telemetry.close()
+            self._telemetry = None
+
+    def start_recording(self, path, chunk_ticks=256):
+        self.stop_recording()
+        metadata = {
+            'cars': list(self._model_dirs),
+            'track': {'width': self._track.width, 'height': self._track.height},
+            'checkpoints': list(self._track.checkpoint_ids),
+        }
+        self._recorder = RaceRecorder(path, len(self._cars), chunk_ticks, metadata)
+        return self._recorder
+
+    def stop_recording(self):
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    def _car_values(self, attr):
+        if self._fleet is not None:
+            return self._fleet.arrays[attr][:self._fleet.count]
+        return [getattr(c, attr) for c in self._cars]
+
+    def _clear_controls(self):
+        if self._fleet is not None:
+            self._fleet.arrays['_controls'][:self._fleet.count] = 0
+        else:
+            for car in self._cars:
+                car._controls = 0
+
+    def _apply_controls(self, control_funcs):
+        prof = self._profiler if self._profiler.enabled else None
+        groups = {}
         for idx, car in enumerate(self._cars):
-            car.update(self._cars)
-            
-            car_x = car.get_observation()['x']
-            car_y = car.get_observation()['y']
-            checkpoint = self._track.check_checkpoint(car_x, car_y)
-            
-            if checkpoint is not None:
-                if checkpoint == self._next_checkpoint[idx]:
-                    self._checkpoints_collected[idx].add(checkpoint)
-                    self._next_checkpoint[idx] = self._next_checkpoint[idx] + 1
-                    if self._next_checkpoint[idx] > 9:
-                        self._laps_completed[idx] += 1
-                        now = pygame.time.get_ticks()
-                        lap_time = (now - self._lap_start_time[idx]) / 1000.0
-                        self._lap_times[idx].append(lap_time)
-                        self._lap_start_time[idx] = now
-                        self._checkpoints_collected[idx] = set()
-                        self._next_checkpoint[idx] = 1
+            func = control_funcs[idx]
+            if getattr(func, 'batched', False):
+                groups.setdefault(id(func), (func, []))[1].append(idx)
+            elif prof is None:
+                func(car)
+            else:
+                start = prof.clock()
+                func(car)
+                prof.record(self._controller_keys[idx], start, tid=1)
+        if not groups:
+            return
+        obs = self.observations()
+        for func, idxs in groups.values():
+            start = prof.clock() if prof else 0
+            actions = func(obs[idxs])
+            if prof:
+                prof.record('controller/batch:' + getattr(func, '__qualname__', 'batch') + '[' + str(len(idxs)) + ']', start, tid=1)
+            apply = apply_controls if getattr(func, 'control_bits', False) else apply_action
+            for idx, action in zip(idxs, np.asarray(actions).tolist()):
+                apply(self._cars[idx], action)
+
+    def _positions(self):
+        if self._fleet is not None:
+            n = self._fleet.count
+            return self._fleet.arrays['_x'][:n], self._fleet.arrays['_y'][:n]
+        xs = np.array([c._x for c in self._cars], dtype=np.float64)
+        ys = np.array([c._y for c in self._cars], dtype=np.float64)
+        return xs, ys
+
+    def _update_checkpoints(self):
+        if not self._cars or len(self._checkpoint_ids) == 0:
+            return
+        xs, ys = self._positions()
+        reached = self._track.check_checkpoints(xs, ys) == self._next_checkpoint
+        if not reached.any():
+            return
+        total = len(self._checkpoint_ids)
+        self._checkpoints_collected[reached] += 1
+        finished = reached & (self._checkpoints_collected >= total)
+        if finished.any():
+            now = self.get_ticks()
+            for idx in np.flatnonzero(finished).tolist():
+                self._lap_times[idx].append(float(now - self._lap_start_time[idx]) / 1000.0)
+            self._last_lap_time[finished] = (now - self._lap_start_time[finished]) / 1000.0
+            self._laps_completed[finished] += 1
+            self._lap_start_time[finished] = now
+            self._checkpoints_collected[finished] = 0
+        self._next_checkpoint[reached] = self._checkpoint_ids[self._checkpoints_collected[reached]]
     
+    def _hud_text(self, idx):
+        laps = self._laps_completed[idx]
+        checkpoints = self._checkpoints_collected[idx]
+        return f"Car {idx+1}: Lap {laps+1}, CP {checkpoints}/{self._track.num_checkpoints}"
+
+    def _render_background(self):
+        # Everything static (the track under the current camera) is drawn
+        # once here; frames only restore the parts that cars and HUD text
+        # have touched.
+        key = (self._screen.get_size(), self._camera.zoom, self._camera.offset_x, self._camera.offset_y)
+        if self._background is not None and key == self._background_key:
+            return False
+        self._background = pygame.Surface(self._screen.get_size()).convert()
+        self._background.fill((0, 0, 0))
+        self._track.render(self._background, self._camera)
+        self._background_key = key
+        return True
+
     def render(self):
-        self._screen.fill((0, 0, 0))
+        if self._headless:
+            return
+        screen = self._screen
+        full = self._render_background()
+        if self._hud_font is None:
+            self._hud_font = pygame.font.Font(None, 24)
 
-        self._track.render(self._screen, self._camera)
-        
-        for idx, car in enumerate(self._cars):
-            car.render(self._screen, self._camera)
-        
-        if self._cars:
-            font = pygame.font.Font(None, 24)
-            for idx, car in enumerate(self._cars):
-                laps = self._laps_completed.get(idx, 0)
-                checkpoints = len(self._checkpoints_collected.get(idx, set()))
-                text = font.render(f"Car {idx+1}: Lap {laps+1}, CP {checkpoints}/9", True, (255, 255, 255))
-                self._screen.blit(text, (10, 10 + idx * 25))
-        
-        pygame.display.flip()
+        hud = self._hud_lines
+        while len(hud) < len(self._cars):
+            hud.append([None, None, None])
+        changed = []
+        for idx in range(len(self._cars)):
+            text = self._hud_text(idx)
+            line = hud[idx]
+            if text != line[0]:
+                surface = self._hud_font.render(text, True, (255, 255, 255))
+                rect = surface.get_rect(topleft=(10, 10 + idx * 25))
+                changed.append(line[2].union(rect) if line[2] else rect)
+                line[:] = [text, surface, rect]
+
+        if full:
+            screen.blit(self._background, (0, 0))
+            dirty = None
+        else:
+            dirty = list(self._car_rects) + changed
+            if self._overlay_rect is not None:
+                dirty.append(self._overlay_rect)
+            for rect in dirty:
+                screen.blit(self._background, rect, rect)
+
+        self._car_rects = [car.render(screen, self._camera) for car in self._cars]
+
+        for text, surface, rect in hud[:len(self._cars)]:
+            if full or rect.collidelist(dirty) >= 0 or rect.collidelist(self._car_rects) >= 0:
+                screen.blit(surface, rect)
+
+        self._overlay_rect = None
+        if self._profiler.enabled and self._profiler.overlay:
+            self._overlay_rect = self._profiler.draw(screen)
+
+        if full:
+            pygame.display.flip()
+        else:
+            dirty.extend(self._car_rects)
+            if self._overlay_rect is not None:
+                dirty.append(self._overlay_rect)
+            pygame.display.update(dirty)
+
+    def _render_due(self):
+        now = time.perf_counter()
+        if now < self._next_render:
+            return False
+        self._next_render = max(self._next_render + self._render_interval, now)
+        return True
         
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self._running = False
+                self.stop_recording()
+                self.stop_telemetry()
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                on = not (self._profiler.enabled and self._profiler.overlay)
+                self.set_profiling(on, overlay=on)
     
-    def run(self, control_funcs=None):
+    def run(self, control_funcs=None, max_steps=None):
         while self._running:
-            self.handle_events()
+            if max_steps is not None and self._steps >= max_steps:
+                break
+            prof = self._profiler if self._profiler.enabled else None
+            if prof:
+                t = prof.begin_frame()
+            if not self._headless:
+                self.handle_events()
+                if prof:
+                    t = prof.record('events', t)
             
             if control_funcs:
                 if len(control_funcs) != len(self._cars):
                     print("Mismatch: control_funcs=" + str(len(control_funcs)) + ", cars=" + str(len(self._cars)))
                     self._running = False
                 else:
-                    for idx, car in enumerate(self._cars):
-                        control_funcs[idx](car)
+                    self._apply_controls(control_funcs)
+                    if prof:
+                        t = prof.record('controls', t)
             
             self.step()
-            self.render()
-            self._clock.tick(self._fps)
+            if prof:
+                t = prof.record('step', t)
+            if not self._headless:
+                if self._render_due():
+                    self.render()
+                    if prof:
+                        t = prof.record('render', t)
+                self._clock.tick(self._fps)
+                if prof:
+                    prof.record('tick_wait', t)
+            if prof:
+                prof.end_frame()
         
-        pygame.quit()
-    def all_coords(self, idx):
-        to_ret = [c.get_position() for c in self._cars]
-        to_ret.pop(idx)
-        return to_ret
+        self.stop_recording()
+        self.stop_telemetry()
+        if not self._headless:
+            pygame.quit()
+    def _rebuild_grid(self):
+        xs, ys = self._positions()
+        self._grid.rebuild(xs, ys)
+        self._grid_dirty = False
+
+    def _invalidate_observations(self):
+        # A car was moved between steps (Car.reset): every per-tick view
+        # of the positions is rebuilt on its next read.
+        self._obs_version += 1
+        self._obs_buffer_tick = -1
+        self._rays_tick = -1
+        self._grid_dirty = True
+
+    def _contact_candidates(self, idx):
+        car = self._cars[idx]
+        reach = max(car._hitbox.width, car._hitbox.height) + self._grid_slack
+        x = self._grid.xs[idx]
+        y = self._grid.ys[idx]
+        near = self._grid.candidates(x - reach, y - reach, x + reach, y + reach)
+        group = self._contact_group
+        if group:
+            near = near[near // group == idx // group]
+        return [self._cars[j] for j in near]
+
+    def cars_within(self, x, y, radius, exclude=None):
+        if self._grid_dirty:
+            self._rebuild_grid()
+        reach = radius + self._grid_slack
+        near = self._grid.candidates(x - reach, y - reach, x + reach, y + reach)
+        found = []
+        for j in near.tolist():
+            if j == exclude:
+                continue
+            cx, cy = self._cars[j].get_position()
+            d = math.hypot(cx - x, cy - y)
+            if d <= radius:
+                found.append((d, j))
+        found.sort()
+        return [j for d, j in found]
+
+    def nearest_cars(self, x, y, k, exclude=None):
+        available = len(self._cars) - (0 if exclude is None else 1)
+        k = min(k, available)
+        radius = self._grid.cell_size
+        while True:
+            found = self.cars_within(x, y, radius, exclude)
+            if len(found) >= k:
+                return found[:k]
+            radius *= 2
 
+    def observations(self):
+        if self._obs_buffer_tick == self._steps:
+            return self._obs_buffer
+        buf = self._obs_buffer
+        buf.flags.writeable = True
+        now = self.get_ticks()
+        if self._fleet is not None:
+            a = self._fleet.arrays
+            n = self._fleet.count
+            buf[:, OBS_INDEX['x']] = a['_x'][:n]
+            buf[:, OBS_INDEX['y']] = a['_y'][:n]
+            buf[:, OBS_INDEX['angle_degrees']] = a['_angle'][:n]
+            buf[:, OBS_INDEX['steering_angle']] = a['_steering_angle'][:n]
+            buf[:, OBS_INDEX['speed']] = a['_velocity'][:n]
+            buf[:, OBS_INDEX['collided']] = self._fleet.in_collision(now)
+        else:
+            for idx, car in enumerate(self._cars):
+                row = buf[idx]
+                row[OBS_INDEX['x']] = car._x
+                row[OBS_INDEX['y']] = car._y
+                row[OBS_INDEX['angle_degrees']] = car._angle
+                row[OBS_INDEX['steering_angle']] = car._steering_angle
+                row[OBS_INDEX['speed']] = car._velocity
+                row[OBS_INDEX['collided']] = car._is_in_collision()
+        buf[:, OBS_INDEX['lap_progress']] = self._track.distance_field.lap_progress_many(
+            self._next_checkpoint, buf[:, OBS_INDEX['x']], buf[:, OBS_INDEX['y']])
+        buf[:, OBS_INDEX['lap_number']] = self._laps_completed + 1
+        buf[:, OBS_INDEX['current_lap_time']] = (now - self._lap_start_time) / 1000.0
+        buf.flags.writeable = False
+        self._obs_buffer_tick = self._steps
+        return buf
+
+    def ray_distances(self):
+        if self._rays_tick != self._steps or self._rays is None:
+            xs, ys = self._positions()
+            if self._fleet is not None:
+                headings = self._fleet.arrays['_angle'][:self._fleet.count]
+            else:
+                headings = [c._angle for c in self._cars]
+            self._rays = self._track.cast_rays(xs, ys, headings)
+            self._rays.flags.writeable = False
+            self._rays_tick = self._steps
+        return self._rays
+
+    def standings(self):
+        total = self._laps_completed + self.observations()[:, OBS_INDEX['lap_progress']]
+        return np.argsort(-total, kind='stable').tolist()
+
+    def all_coords(self, idx):
+        x, y = self._cars[idx].get_position()
+        return [self._cars[j].get_position() for j in self.cars_within(x, y, NEIGHBOR_RADIUS, exclude=idx)]
@@ -0,0 +1,130 @@
+import builtins
+import importlib
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+# Heavy modules every model tends to import. Importing them once up front
+# (or in a forkserver) keeps that cost out of each model's own load.
+PRELOAD_MODULES = ('numpy', 'torch')
+
+
+def preload(modules=PRELOAD_MODULES):
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[name] = (time.perf_counter() - start) * 1000.0
+    return timings
+
+
+def _hook_torch_load(spent):
+    # Time torch.load separately from the rest of the import. If torch has
+    # not been imported yet (preload skipped), wrap torch.load as soon as
+    # the model's own import of it returns.
+    hooked = []
+
+    def hook(torch):
+        original = torch.load
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                spent[0] += time.perf_counter() - start
+
+        torch.load = timed
+        hooked.append((torch, original))
+
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        hook(torch)
+        original_import = None
+    else:
+        original_import = builtins.__import__
+
+        def watched(name, *args, **kwargs):
+            module = original_import(name, *args, **kwargs)
+            torch = sys.modules.get('torch')
+            # torch imports its own submodules while it initialises; wait
+            # until the outermost import has finished.
+            if (not hooked and torch is not None and hasattr(torch, 'load')
+                    and not getattr(torch.__spec__, '_initializing', False)):
+                hook(torch)
+            return module
+
+        builtins.__import__ = watched
+
+    def restore():
+        if original_import is not None:
+            builtins.__import__ = original_import
+        for torch, original in hooked:
+            torch.load = original
+    return restore
+
+
+def load_model(model_dir):
+    # Returns (control function, timings). Timings are in milliseconds;
+    # 'started' is a time.monotonic() stamp so reports from different
+    # processes line up on one timeline.
+    model_dir = Path(model_dir)
+    model_file = model_dir / "model.py"
+    timings = {'name': model_dir.name, 'started': time.monotonic(),
+               'import_ms': 0.0, 'load_ms': 0.0, 'warmup_ms': 0.0}
+    if not model_file.exists():
+        raise FileNotFoundError(f"{model_file} not found")
+
+    spent = [0.0]
+    restore = _hook_torch_load(spent)
+    start = time.perf_counter()
+    try:
+        spec = importlib.util.spec_from_file_location(f"{model_dir.name}.model", str(model_file))
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+    finally:
+        restore()
+    total = time.perf_counter() - start
+    timings['load_ms'] = spent[0] * 1000.0
+    timings['import_ms'] = (total - spent[0]) * 1000.0
+
+    if hasattr(mod, "batch_model"):
+        func = mod.batch_model
+    elif hasattr(mod, "model"):
+        func = mod.model
+    else:
+        raise AttributeError(f"{model_dir.name} has no 'model' function")
+
+    # Per-car models may list the observation keys they read; sandboxes
+    # then only compute and send those. None means all of them.
+    fields = getattr(mod, "OBSERVATION_FIELDS", None)
+    timings['fields'] = tuple(fields) if fields is not None else None
+
+    warmup = getattr(mod, "warmup", None)
+    if warmup is not None:
+        start = time.perf_counter()
+        warmup()
+        timings['warmup_ms'] = (time.perf_counter() - start) * 1000.0
+    timings['ready'] = time.monotonic()
+    return func, timings
+
+
+def print_startup_report(rows, origin, shared=None):
+    print("\nStartup report:")
+    if shared:
+        print("  preloaded " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in shared.items()))
+    print(f"  {'model':<20} {'start':>8} {'import':>8} {'load':>8} {'warm-up':>8} {'ready':>8}")
+    end = origin
+    for r in sorted(rows, key=lambda r: r.get('ready', r['started'])):
+        if 'error' in r:
+            print(f"  {r['name']:<20} failed: {r['error']}")
+            continue
+        end = max(end, r['ready'])
+        print(f"  {r['name']:<20} {(r['started'] - origin) * 1000.0:>6.0f}ms"
+              f" {r['import_ms']:>6.0f}ms {r['load_ms']:>6.0f}ms {r['warmup_ms']:>6.0f}ms"
+              f" {(r['ready'] - origin) * 1000.0:>6.0f}ms")
+    print(f"  all models ready after {(end - origin):.2f}s")
@@ -0,0 +1,146 @@
+import csv
+import json
+import time
+from collections import deque
+import numpy as np
+import pygame
+
+FRAME = 'frame'
+PHASES = ('events', 'controls', 'step', 'render', 'tick_wait')
+
+
+class _Series:
+    # Fixed-size ring of the most recent samples, in milliseconds.
+    def __init__(self, window):
+        self.samples = np.zeros(window, dtype=np.float64)
+        self.count = 0
+        self.total = 0
+        self.pos = 0
+
+    def add(self, ms):
+        self.samples[self.pos] = ms
+        self.pos = (self.pos + 1) % self.samples.size
+        self.count = min(self.count + 1, self.samples.size)
+        self.total += 1
+
+    def values(self):
+        return self.samples[:self.count]
+
+
+class FrameProfiler:
+    clock = staticmethod(time.perf_counter_ns)
+
+    def __init__(self, window=600, max_events=200000, enabled=False):
+        self.window = int(window)
+        self.enabled = enabled
+        self.overlay = False
+        self._series = {}
+        self._events = deque(maxlen=max_events)
+        self._origin = self.clock()
+        self._frame_start = 0
+        self._font = None
+
+    def reset(self):
+        self._series.clear()
+        self._events.clear()
+        self._origin = self.clock()
+
+    def record(self, key, start, tid=0):
+        end = self.clock()
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series(self.window)
+        series.add((end - start) / 1e6)
+        self._events.append((key, start, end, tid))
+        return end
+
+    def begin_frame(self):
+        self._frame_start = self.clock()
+        return self._frame_start
+
+    def end_frame(self):
+        return self.record(FRAME, self._frame_start)
+
+    def keys(self):
+        return list(self._series)
+
+    def stats(self, key):
+        series = self._series[key]
+        values = series.values()
+        return {
+            'count': series.total,
+            'mean': float(values.mean()),
+            'p50': float(np.percentile(values, 50)),
+            'p90': float(np.percentile(values, 90)),
+            'p99': float(np.percentile(values, 99)),
+            'max': float(values.max()),
+        }
+
+    def summary(self):
+        return {key: self.stats(key) for key in self._series}
+
+    def histogram(self, key, bins=20):
+        return np.histogram(self._series[key].values(), bins=bins)
+
+    def slowest(self, prefix, n=5):
+        found = [(self._series[key].values().mean(), key) for key in self._series if key.startswith(prefix)]
+        found.sort(reverse=True)
+        return [(key, mean) for mean, key in found[:n]]
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({'unit': 'ms', 'window': self.window, 'stats': self.summary()}, f, indent=2)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['key', 'count', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'])
+            for key, s in self.summary().items():
+                writer.writerow([key, s['count'], s['mean'], s['p50'], s['p90'], s['p99'], s['max']])
+
+    def export_chrome_trace(self, path):
+        # Complete ("X") events in microseconds, loadable in chrome://tracing
+        # or Perfetto. Frame phases sit on thread 0, controllers on 1.
+        events = []
+        for key, start, end, tid in self._events:
+            events.append({
+                'name': key,
+                'cat': key.split('/', 1)[0],
+                'ph': 'X',
+                'ts': (start - self._origin) / 1e3,
+                'dur': (end - start) / 1e3,
+                'pid': 0,
+                'tid': tid,
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def export(self, path):
+        path = str(path)
+        if path.endswith('.csv'):
+            self.export_csv(path)
+        elif path.endswith('.trace.json') or path.endswith('.trace'):
+            self.export_chrome_trace(path)
+        else:
+            self.export_json(path)
+
+    def draw(self, screen):
+        if self._font is None:
+            self._font = pygame.font.Font(None, 20)
+        lines = []
+        for key in (FRAME,) + PHASES:
+            if key in self._series:
+                s = self._series[key].values()
+                lines.append(f"{key:<9} {s.mean():6.2f} ms  p99 {np.percentile(s, 99):6.2f}")
+        for key, mean in self.slowest('controller/', 3):
+            lines.append(f"{key[len('controller/'):]:<9} {mean:6.2f} ms")
+        if not lines:
+            return None
+        width = max(self._font.size(line)[0] for line in lines) + 12
+        x = screen.get_width() - width - 10
+        panel = pygame.Surface((width, len(lines) * 18 + 8), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 160))
+        rect = screen.blit(panel, (x, 10))
+        for i, line in enumerate(lines):
+            screen.blit(self._font.render(line, True, (255, 255, 255)), (x + 6, 14 + i * 18))
+        return rect
@@ -0,0 +1,236 @@
+import json
+import struct
+import numpy as np
+from car.sprites import SpriteAtlas
+
+MAGIC = b'EXMLREC1'
+INDEX_MAGIC = b'EXMLIDX1'
+CHUNK_MAGIC = b'CHNK'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sIII')
+_CHUNK = struct.Struct('<4sIB7x')
+_TRAILER = struct.Struct('<8sQQ')
+
+_MODE_DELTA = 0
+_MODE_RAW = 1
+
+# (name, car attribute, fixed-point scale). Fields without an attribute
+# are filled from the game's lap bookkeeping.
+RECORD_FIELDS = (
+    ('x', '_x', 100),
+    ('y', '_y', 100),
+    ('angle', '_angle', 100),
+    ('velocity', '_velocity', 1000),
+    ('steering', '_steering_angle', 100),
+    ('rev', '_rev', 10000),
+    ('boost_energy', '_boost_energy', 10000),
+    ('boost_active', '_boost_active', 1),
+    ('collision_ms', None, 1),
+    ('laps', None, 1),
+    ('checkpoints', None, 1),
+    ('next_checkpoint', None, 1),
+)
+
+
+_COLUMN = {name: col for col, (name, _, _) in enumerate(RECORD_FIELDS)}
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class RaceRecorder:
+    def __init__(self, path, num_cars, chunk_ticks=256, metadata=None):
+        self.path = str(path)
+        self.num_cars = int(num_cars)
+        self.chunk_ticks = int(chunk_ticks)
+        self._fields = len(RECORD_FIELDS)
+        self._scales = np.array([scale for _, _, scale in RECORD_FIELDS], dtype=np.float64)
+        self._state = np.zeros((self.chunk_ticks, self.num_cars, self._fields), dtype=np.int32)
+        self._actions = np.zeros((self.chunk_ticks, self.num_cars), dtype=np.uint8)
+        self._times = np.zeros(self.chunk_ticks, dtype=np.float64)
+        self._pending = 0
+        self._offsets = []
+        self.ticks = 0
+
+        meta = dict(metadata or {})
+        meta['fields'] = [name for name, _, _ in RECORD_FIELDS]
+        meta['scales'] = self._scales.tolist()
+        blob = json.dumps(meta).encode('utf-8')
+        self._file = open(self.path, 'wb')
+        head = _HEADER.pack(MAGIC, VERSION, self.num_cars, self.chunk_ticks) + struct.pack('<I', len(blob)) + blob
+        self._file.write(head + b'\0' * (_align(len(head)) - len(head)))
+
+    def capture(self, game):
+        row = self._state[self._pending]
+        for col, (name, attr, scale) in enumerate(RECORD_FIELDS):
+            if attr is not None:
+                row[:, col] = np.rint(np.asarray(game._car_values(attr), dtype=np.float64) * scale)
+        now = game.get_ticks()
+        ends = np.asarray(game._car_values('_collision_end_time'), dtype=np.float64)
+        row[:, _COLUMN['collision_ms']] = np.rint(np.maximum(0.0, ends - now))
+        row[:, _COLUMN['laps']] = game._laps_completed
+        row[:, _COLUMN['checkpoints']] = game._checkpoints_collected
+        row[:, _COLUMN['next_checkpoint']] = game._next_checkpoint
+        self._actions[self._pending] = np.asarray(game._car_values('_controls')) & 0xFF
+        self._times[self._pending] = now
+        self._pending += 1
+        self.ticks += 1
+        if self._pending == self.chunk_ticks:
+            self._flush()
+
+    def _flush(self):
+        n = self._pending
+        if n == 0:
+            return
+        state = self._state[:n]
+        deltas = np.diff(state.astype(np.int64), axis=0)
+        if deltas.size == 0 or (np.abs(deltas).max() <= np.iinfo(np.int16).max):
+            mode = _MODE_DELTA
+            body = deltas.astype(np.int16).tobytes()
+        else:
+            mode = _MODE_RAW
+            body = state[1:].tobytes()
+
+        self._offsets.append(self._file.tell())
+        parts = [_CHUNK.pack(CHUNK_MAGIC, n, mode), self._times[:n].tobytes(), state[0].tobytes(), body,
+                 self._actions[:n].tobytes()]
+        data = b''.join(parts)
+        self._file.write(data + b'\0' * (_align(len(data)) - len(data)))
+        self._pending = 0
+
+    def close(self):
+        if self._file is None:
+            return
+        self._flush()
+        index_at = self._file.tell()
+        self._file.write(np.array(self._offsets, dtype=np.int64).tobytes())
+        self._file.write(_TRAILER.pack(INDEX_MAGIC, len(self._offsets), index_at))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RaceReplay:
+    def __init__(self, path):
+        self.path = str(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        magic, version, num_cars, chunk_ticks = _HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(self.path + " is not a race recording")
+        if version != VERSION:
+            raise ValueError("Unsupported recording version " + str(version))
+        (blob_len,) = struct.unpack_from('<I', self._data, _HEADER.size)
+        start = _HEADER.size + 4
+        self.metadata = json.loads(bytes(self._data[start:start + blob_len]).decode('utf-8'))
+        self.num_cars = num_cars
+        self.chunk_ticks = chunk_ticks
+        self.fields = list(self.metadata['fields'])
+        self._scales = np.array(self.metadata['scales'], dtype=np.float64)
+        self._offsets = self._read_index(_align(start + blob_len))
+        self._chunk_cache = {}
+
+        if self._offsets:
+            last = self._chunk(len(self._offsets) - 1)
+            self.ticks = (len(self._offsets) - 1) * self.chunk_ticks + last[0]
+        else:
+            self.ticks = 0
+
+    def _read_index(self, first_chunk):
+        size = self._data.size
+        if size >= _TRAILER.size:
+            magic, count, index_at = _TRAILER.unpack_from(self._data, size - _TRAILER.size)
+            if magic == INDEX_MAGIC:
+                return np.frombuffer(self._data, dtype=np.int64, count=count, offset=index_at).tolist()
+        # Recording was not closed cleanly: walk the chunks from the front.
+        offsets = []
+        pos = first_chunk
+        fields = len(self.fields)
+        while pos + _CHUNK.size <= size:
+            magic, n, mode = _CHUNK.unpack_from(self._data, pos)
+            if magic != CHUNK_MAGIC or n == 0:
+                break
+            length = self._chunk_length(n, mode, fields)
+            if pos + length > size:
+                break
+            offsets.append(pos)
+            pos += _align(length)
+        return offsets
+
+    def _chunk_length(self, n, mode, fields):
+        cars = self.num_cars
+        state = cars * fields * 4
+        step = 2 if mode == _MODE_DELTA else 4
+        return _CHUNK.size + n * 8 + state + (n - 1) * cars * fields * step + n * cars
+
+    def _chunk(self, c):
+        cached = self._chunk_cache.get(c)
+        if cached is not None:
+            return cached
+        pos = self._offsets[c]
+        _, n, mode = _CHUNK.unpack_from(self._data, pos)
+        cars = self.num_cars
+        fields = len(self.fields)
+        pos += _CHUNK.size
+        times = np.frombuffer(self._data, dtype=np.float64, count=n, offset=pos)
+        pos += n * 8
+        key = np.frombuffer(self._data, dtype=np.int32, count=cars * fields, offset=pos).reshape(cars, fields)
+        pos += cars * fields * 4
+        if mode == _MODE_DELTA:
+            body = np.frombuffer(self._data, dtype=np.int16, count=(n - 1) * cars * fields, offset=pos)
+            pos += (n - 1) * cars * fields * 2
+        else:
+            body = np.frombuffer(self._data, dtype=np.int32, count=(n - 1) * cars * fields, offset=pos)
+            pos += (n - 1) * cars * fields * 4
+        body = body.reshape(n - 1, cars, fields)
+        actions = np.frombuffer(self._data, dtype=np.uint8, count=n * cars, offset=pos).reshape(n, cars)
+
+        states = np.empty((n, cars, fields), dtype=np.int64)
+        states[0] = key
+        if mode == _MODE_DELTA:
+            np.cumsum(body, axis=0, dtype=np.int64, out=states[1:])
+            states[1:] += key
+        else:
+            states[1:] = body
+        chunk = (n, times, states, actions)
+        if len(self._chunk_cache) >= 4:
+            self._chunk_cache.pop(next(iter(self._chunk_cache)))
+        self._chunk_cache[c] = chunk
+        return chunk
+
+    def _locate(self, tick):
+        if tick < 0:
+            tick += self.ticks
+        if tick < 0 or tick >= self.ticks:
+            raise IndexError("tick " + str(tick) + " out of range for " + str(self.ticks) + " ticks")
+        return self._chunk(tick // self.chunk_ticks), tick % self.chunk_ticks
+
+    def __len__(self):
+        return self.ticks
+
+    def state(self, tick):
+        (n, times, states, actions), k = self._locate(tick)
+        values = states[k] / self._scales
+        return {name: values[:, col] for col, name in enumerate(self.fields)}
+
+    def actions(self, tick):
+        (n, times, states, actions), k = self._locate(tick)
+        return actions[k]
+
+    def time_ms(self, tick):
+        (n, times, states, actions), k = self._locate(tick)
+        return float(times[k])
+
+    def render(self, screen, tick, track, camera=None, image_path="assets/car.png"):
+        sprite = SpriteAtlas.get(image_path)
+        state = self.state(tick)
+        track.render(screen, camera)
+        z = int(max(1, round(camera.zoom))) if camera else 1
+        for x, y, angle in zip(state['x'].tolist(), state['y'].tolist(), state['angle'].tolist()):
+            sprite.blit(screen, camera.apply((x, y)) if camera else (x, y), angle, z)
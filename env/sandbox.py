@@ -0,0 +1,385 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from pathlib import Path
+import time
+import traceback
+import numpy as np
+from car.observation import OBS_FIELDS
+from env.constants import CELL_SIZE, RAY_ANGLES
+from env.controls import (CONTROL_BACK, CONTROL_BOOST, CONTROL_BRAKE, CONTROL_FORWARD, CONTROL_LEFT,
+                          CONTROL_RESET, CONTROL_RIGHT, apply_action)
+from env.loading import PRELOAD_MODULES, load_model, print_startup_report
+
+FALLBACK_PREVIOUS = 'previous'
+FALLBACK_NOOP = 'noop'
+
+# Float64 columns next to the float32 observation rows, for per-car models:
+# the scalar observation values at full precision, then ray_distances.
+# lap_times and all_coords vary in length and travel with the tick message.
+_EXTRA_FIELDS = (
+    'x', 'y', 'angle_degrees', 'steering_angle', 'speed', 'lap_progress',
+    'current_lap_time', 'next_checkpoint_heading', 'next_checkpoint_distance',
+)
+_EXTRA_COLUMNS = len(_EXTRA_FIELDS) + len(RAY_ANGLES)
+
+
+class _SandboxCar:
+    # Stand-in for Car inside a sandbox: controls are collected as
+    # CONTROL_* bits and sent back, observations come from shared memory.
+    def __init__(self):
+        self._controls = 0
+        self._obs = None
+
+    def get_observation(self):
+        return self._obs
+
+    def accelerate_fwd(self):
+        self._controls |= CONTROL_FORWARD
+
+    def accelerate_bck(self):
+        self._controls |= CONTROL_BACK
+
+    def steer_left(self):
+        self._controls |= CONTROL_LEFT
+
+    def steer_right(self):
+        self._controls |= CONTROL_RIGHT
+
+    def brake(self):
+        self._controls |= CONTROL_BRAKE
+
+    def request_boost(self):
+        self._controls |= CONTROL_BOOST
+
+    def reset(self):
+        self._controls |= CONTROL_RESET
+
+
+def _context():
+    # A forkserver that has already imported torch hands every sandbox a
+    # warm interpreter, so workers start in parallel without each paying
+    # for the import. Plain fork/spawn where it is unavailable.
+    methods = mp.get_all_start_methods()
+    if 'forkserver' in methods:
+        ctx = mp.get_context('forkserver')
+        ctx.set_forkserver_preload(list(PRELOAD_MODULES))
+        return ctx
+    return mp.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+def _observation(row, extra, sent, keep):
+    # The dict Car.get_observation() would have given, with the same keys
+    # and types. Without extra columns (a pool not bound to a game) only
+    # the OBS_FIELDS are there; with keep, only the OBS_FIELDS and the
+    # keys the model declared.
+    obs = dict(zip(OBS_FIELDS, row))
+    obs['lap_number'] = int(obs['lap_number'])
+    obs['collided'] = bool(obs['collided'])
+    if extra is None:
+        return obs
+    obs.update(zip(_EXTRA_FIELDS, extra))
+    if obs['next_checkpoint_heading'] != obs['next_checkpoint_heading']:
+        obs['next_checkpoint_heading'] = None
+    obs['track_coords'] = (int(obs['x'] // CELL_SIZE), int(obs['y'] // CELL_SIZE))
+    obs['ray_distances'] = extra[len(_EXTRA_FIELDS):]
+    obs['lap_times'], obs['all_coords'] = sent
+    if keep is not None:
+        obs = {key: value for key, value in obs.items() if key in keep}
+    return obs
+
+
+def _worker(conn, model_dir, cars, spec):
+    try:
+        func, timings = load_model(model_dir)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        conn.close()
+        return
+    shm = shared_memory.SharedMemory(name=spec[0])
+    obs = np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+    extras = np.ndarray(spec[3], dtype=np.float64, buffer=shm.buf, offset=spec[4])
+    proxies = [_SandboxCar() for _ in cars]
+    is_batched = getattr(func, 'batched', False)
+    timings['batched'] = is_batched
+    keep = None if timings['fields'] is None else set(OBS_FIELDS) | set(timings['fields'])
+    conn.send(('ready', timings))
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            tick, slot, sent = msg
+            rows = obs[slot, cars].copy()
+            error = None
+            for proxy in proxies:
+                proxy._controls = 0
+            try:
+                if is_batched:
+                    for proxy, action in zip(proxies, np.asarray(func(rows)).tolist()):
+                        apply_action(proxy, action)
+                else:
+                    extra = extras[slot, cars].tolist() if sent is not None else [None] * len(cars)
+                    sent = sent if sent is not None else [None] * len(cars)
+                    for proxy, row, ext, car_sent in zip(proxies, rows.tolist(), extra, sent):
+                        proxy._obs = _observation(row, ext, car_sent, keep)
+                        func(proxy)
+            except Exception:
+                error = traceback.format_exc(limit=3)
+            conn.send((tick, [p._controls for p in proxies], error))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+        conn.close()
+
+
+class _Sandbox:
+    def __init__(self, name, cars):
+        self.name = name
+        self.cars = cars
+        self.batched = False
+        self.fields = None
+        self.conn = None
+        self.proc = None
+        self.alive = False
+        self.busy = False
+        self.position = None
+        self.last = np.zeros(len(cars), dtype=np.int64)
+        self.ticks = 0
+        self.late = 0
+        self.errors = 0
+        self.last_error = None
+        self.crashed = False
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+
+class SandboxPool:
+    # Runs each model folder in its own process. Used as a single batched
+    # control function for every car: F1Game hands it the observation rows,
+    # it fans them out over shared memory and returns CONTROL_* bits.
+    # Per-car models get the full get_observation() dict once the pool is
+    # bound to the game with bind(), or just the keys they declare in
+    # OBSERVATION_FIELDS; unbound, only the OBS_FIELDS.
+    batched = True
+    control_bits = True
+
+    def __init__(self, model_dirs, deadline_ms=10.0, fallback=FALLBACK_PREVIOUS, load_timeout=120.0):
+        if fallback not in (FALLBACK_PREVIOUS, FALLBACK_NOOP):
+            raise ValueError("fallback must be 'previous' or 'noop'")
+        self.deadline_ms = float(deadline_ms)
+        self.fallback = fallback
+        names = [Path(d).name for d in model_dirs]
+        self._sandboxes = [_Sandbox(name, [idx]) for idx, name in enumerate(names)]
+        shape = (2, len(names), len(OBS_FIELDS))
+        extra_shape = (2, len(names), _EXTRA_COLUMNS)
+        # float64 extras after the float32 rows, on an 8-byte boundary.
+        offset = -(-int(np.prod(shape)) * 4 // 8) * 8
+        size = offset + int(np.prod(extra_shape)) * 8
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self._obs = np.ndarray(shape, dtype=np.float32, buffer=self._shm.buf)
+        self._obs.fill(0)
+        self._extras = np.ndarray(extra_shape, dtype=np.float64, buffer=self._shm.buf, offset=offset)
+        self._extras.fill(0)
+        self._game = None
+        self._tick = 0
+        self._closed = False
+        self.startup = []
+        self._origin = time.monotonic()
+
+        ctx = _context()
+        spec = (self._shm.name, shape, np.dtype(np.float32).str, extra_shape, offset)
+        for model_dir, sb in zip(model_dirs, self._sandboxes):
+            parent, child = ctx.Pipe()
+            sb.proc = ctx.Process(target=_worker, args=(child, str(model_dir), sb.cars, spec), daemon=True)
+            sb.proc.start()
+            child.close()
+            sb.conn = parent
+
+        deadline = time.perf_counter() + load_timeout
+        for sb in self._sandboxes:
+            if not sb.conn.poll(max(0.0, deadline - time.perf_counter())):
+                status, detail = 'error', f"did not load within {load_timeout:.0f}s"
+                sb.proc.terminate()
+            else:
+                try:
+                    status, detail = sb.conn.recv()
+                except EOFError:
+                    status, detail = 'error', 'worker exited during load'
+            if status == 'ready':
+                sb.alive = True
+                sb.batched = detail.pop('batched', False)
+                sb.fields = detail.pop('fields', None)
+                self.startup.append(detail)
+            else:
+                print(f"Failed to load {sb.name}: {detail}")
+                sb.last_error = detail
+                self.startup.append({'name': sb.name, 'started': self._origin, 'error': detail})
+
+        # Only models that loaded get a car; row k of the observations
+        # F1Game passes in belongs to the k-th of them.
+        self._active = [sb for sb in self._sandboxes if sb.alive]
+        self.names = [sb.name for sb in self._active]
+        self._rows = np.array([sb.cars[0] for sb in self._active], dtype=np.intp)
+        for k, sb in enumerate(self._active):
+            sb.position = k
+
+    def print_startup_report(self):
+        print_startup_report(self.startup, self._origin)
+
+    def bind(self, game):
+        # Row k of the observations belongs to game._cars[k]; the rest of
+        # each per-car observation is read from there.
+        self._game = game
+
+    def _share_observations(self, slot):
+        # Fills the extra columns for per-car models from the game's own
+        # observation loaders and returns what each sandbox gets in its
+        # tick message: (lap_times, all_coords) per car. The loaders are
+        # lazy, so rays and all_coords are only computed for models that
+        # read them.
+        sent = {}
+        extras = self._extras[slot]
+        for sb in self._active:
+            if sb.batched:
+                continue
+            obs = self._game._cars[sb.position].get_observation()
+            heading = obs['next_checkpoint_heading']
+            row = extras[sb.cars[0]]
+            row[:len(_EXTRA_FIELDS)] = [
+                obs['x'], obs['y'], obs['angle_degrees'], obs['steering_angle'], obs['speed'],
+                obs['lap_progress'], obs['current_lap_time'], np.nan if heading is None else heading,
+                obs['next_checkpoint_distance'],
+            ]
+            wants = sb.fields
+            row[len(_EXTRA_FIELDS):] = obs['ray_distances'] if wants is None or 'ray_distances' in wants else np.nan
+            coords = obs['all_coords'] if wants is None or 'all_coords' in wants else None
+            sent[sb.name] = [(obs['lap_times'], coords)]
+        return sent
+
+    def __call__(self, obs_rows):
+        tick = self._tick
+        self._tick += 1
+        slot = tick & 1
+        self._obs[slot, self._rows] = obs_rows
+        sent = self._share_observations(slot) if self._game is not None else {}
+        actions = np.zeros(len(self._active), dtype=np.int64)
+
+        pending = {}
+        late = []
+        start = time.perf_counter()
+        for sb in self._active:
+            if not sb.alive:
+                continue
+            # A model still working on an earlier tick is not sent another
+            # one, so a hung model cannot back up its pipe.
+            if sb.busy and sb.conn.poll():
+                self._receive(sb)
+            if sb.busy:
+                late.append(sb)
+                continue
+            try:
+                sb.conn.send((tick, slot, sent.get(sb.name)))
+            except (BrokenPipeError, OSError):
+                self._crashed(sb)
+                continue
+            sb.busy = True
+            pending[sb.conn] = sb
+
+        deadline = start + self.deadline_ms / 1000.0
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            for conn in wait(list(pending), remaining):
+                sb = pending.pop(conn)
+                if self._receive(sb) == tick:
+                    elapsed = (time.perf_counter() - start) * 1000.0
+                    sb.ticks += 1
+                    sb.total_ms += elapsed
+                    sb.max_ms = max(sb.max_ms, elapsed)
+                    actions[sb.position] = sb.last[0]
+
+        for sb in late + list(pending.values()):
+            sb.ticks += 1
+            sb.late += 1
+            if self.fallback == FALLBACK_PREVIOUS:
+                actions[sb.position] = sb.last[0]
+        return actions
+
+    def _receive(self, sb):
+        try:
+            seq, bits, error = sb.conn.recv()
+        except (EOFError, OSError):
+            self._crashed(sb)
+            return None
+        sb.busy = False
+        # Replies that missed their own tick still become the "previous"
+        # action, since they are the freshest thing the model has said.
+        sb.last[:] = bits
+        if error is not None:
+            sb.errors += 1
+            sb.last_error = error
+        return seq
+
+    def _crashed(self, sb):
+        sb.alive = False
+        sb.busy = False
+        sb.crashed = True
+        sb.last[:] = 0
+
+    def report(self):
+        result = {}
+        for sb in self._sandboxes:
+            answered = sb.ticks - sb.late
+            result[sb.name] = {
+                'loaded': sb.alive or sb.crashed,
+                'ticks': sb.ticks,
+                'late': sb.late,
+                'errors': sb.errors,
+                'crashed': sb.crashed,
+                'mean_ms': sb.total_ms / answered if answered else None,
+                'max_ms': sb.max_ms,
+                'last_error': sb.last_error,
+            }
+        return result
+
+    def print_report(self):
+        print(f"\nSandbox report (deadline {self.deadline_ms:.1f} ms, fallback {self.fallback}):")
+        for name, r in self.report().items():
+            if not r['loaded']:
+                print(f"  {name}: not loaded")
+                continue
+            mean = f"{r['mean_ms']:.2f}" if r['mean_ms'] is not None else "-"
+            status = " CRASHED" if r['crashed'] else ""
+            print(f"  {name}: {r['late']}/{r['ticks']} late, {r['errors']} errors, "
+                  f"mean {mean} ms, max {r['max_ms']:.2f} ms{status}")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for sb in self._sandboxes:
+            if sb.conn is None:
+                continue
+            try:
+                sb.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for sb in self._sandboxes:
+            if sb.proc is None:
+                continue
+            sb.proc.join(timeout=2)
+            if sb.proc.is_alive():
+                sb.proc.terminate()
+                sb.proc.join(timeout=2)
+            sb.conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
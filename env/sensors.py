@@ -0,0 +1,97 @@
+import math
+import numpy as np
+from env.constants import CELL_SIZE
+
+def wall_distance_bands(collision_mask, band, cap):
+    # Euclidean distance (in pixels) from every cell centre to the nearest
+    # wall cell centre, capped at cap cells, yielded `band` rows at a time.
+    # Each band only looks cap cells past its edges: a vertical pass per
+    # column, then the lower envelope across columns within cap. Anything
+    # beyond the cap reads as the cap, which is all cast_rays needs since
+    # it only steps forward by a lower bound on the clearance. Everything
+    # outside the board counts as wall, matching Track.check_collision.
+    height, width = collision_mask.shape
+    chunked = not isinstance(collision_mask, np.ndarray)
+    offsets = np.arange(1, cap + 1, dtype=np.float32) ** 2
+    for start in range(0, height, band):
+        stop = min(height, start + band)
+        lo = max(0, start - cap)
+        hi = min(height, stop + cap)
+        rows = collision_mask.rows(lo, hi) if chunked else collision_mask[lo:hi]
+        window = np.ones((stop - start + 2 * cap, width), dtype=bool)
+        window[lo - start + cap:hi - start + cap] = rows
+
+        # Rows to the nearest wall above and below, in each column.
+        down = np.empty(window.shape, dtype=np.float32)
+        run = np.full(width, cap + 1, dtype=np.float32)
+        for i in range(len(window)):
+            run = np.where(window[i], 0.0, np.minimum(run + 1, cap + 1))
+            down[i] = run
+        run[:] = cap + 1
+        for i in range(len(window) - 1, cap - 1, -1):
+            run = np.where(window[i], 0.0, np.minimum(run + 1, cap + 1))
+            if i < stop - start + cap:
+                down[i] = np.minimum(down[i], run)
+        vertical = down[cap:stop - start + cap] ** 2
+
+        # Columns past the board are wall, i.e. zero vertical distance.
+        padded = np.zeros((stop - start, width + 2 * cap), dtype=np.float32)
+        padded[:, cap:cap + width] = vertical
+        best = vertical.copy()
+        for k, cost in enumerate(offsets, 1):
+            np.minimum(best, padded[:, cap - k:cap - k + width] + cost, out=best)
+            np.minimum(best, padded[:, cap + k:cap + k + width] + cost, out=best)
+        np.minimum(best, float(cap * cap), out=best)
+        yield np.sqrt(best) * np.float32(CELL_SIZE)
+
+
+def cast_rays(track, xs, ys, headings, ray_angles, max_range):
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    theta = np.radians(np.asarray(headings, dtype=np.float64)[:, None] + np.asarray(ray_angles, dtype=np.float64)[None, :])
+    dir_x = np.sin(theta)
+    dir_y = -np.cos(theta)
+    field = track.wall_distance
+    # A point anywhere inside a cell is at least this close to the nearest
+    # wall cell's boundary, relative to the centre-to-centre distance.
+    slack = CELL_SIZE * math.sqrt(2.0)
+
+    dist = np.zeros(theta.shape, dtype=np.float64)
+    active = np.ones(theta.shape, dtype=bool)
+    start_x = np.broadcast_to(xs[:, None], theta.shape)
+    start_y = np.broadcast_to(ys[:, None], theta.shape)
+    # Runs until every ray has hit a wall or reached max_range. Each step
+    # crosses at least one cell boundary, so a ray hugging a wall takes at
+    # most about 2 * max_range / CELL_SIZE steps and open ones far fewer.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while True:
+            rows, cols = np.nonzero(active)
+            if rows.size == 0:
+                break
+            t = dist[rows, cols]
+            dx = dir_x[rows, cols]
+            dy = dir_y[rows, cols]
+            px = start_x[rows, cols] + dx * t
+            py = start_y[rows, cols] + dy * t
+            gx = (px / CELL_SIZE).astype(np.intp)
+            gy = (py / CELL_SIZE).astype(np.intp)
+            inside = (gx >= 0) & (gy >= 0) & (gx < track.width) & (gy < track.height)
+            clearance = np.zeros(rows.size)
+            clearance[inside] = field[gy[inside], gx[inside]]
+            hit = clearance <= 0
+
+            # Close to a wall, fall back to stepping exactly onto the next
+            # cell boundary so thin or diagonal walls cannot be skipped.
+            cell_x = np.floor(px / CELL_SIZE)
+            cell_y = np.floor(py / CELL_SIZE)
+            to_x = np.where(dx > 0, (cell_x + 1) * CELL_SIZE - px, cell_x * CELL_SIZE - px) / dx
+            to_y = np.where(dy > 0, (cell_y + 1) * CELL_SIZE - py, cell_y * CELL_SIZE - py) / dy
+            to_x = np.where(np.isfinite(to_x), to_x, np.inf)
+            to_y = np.where(np.isfinite(to_y), to_y, np.inf)
+            boundary = np.minimum(to_x, to_y) + 1e-6
+
+            advance = np.maximum(clearance - slack, boundary)
+            t = np.where(hit, t, np.minimum(t + advance, max_range))
+            dist[rows, cols] = t
+            active[rows, cols] = ~hit & (t < max_range)
+    return dist
@@ -0,0 +1,172 @@
+import numpy as np
+from car.fleet import _BOOL_FIELDS, _FLOAT_FIELDS, _INT_FIELDS
+from car.observation import OBS_INDEX
+from env.clock import SimClock
+from env.controls import apply_action
+
+# Per-car game bookkeeping captured next to the car physics.
+_GAME_FIELDS = (
+    ('_checkpoints_collected', np.int64),
+    ('_laps_completed', np.int64),
+    ('_lap_start_time', np.float64),
+    ('_last_lap_time', np.float64),
+    ('_next_checkpoint', np.int16),
+)
+_CAR_FIELDS = _FLOAT_FIELDS + _BOOL_FIELDS + _INT_FIELDS
+# Where Car.reset() sends each car. Fixed for a game's life, but a fork
+# game's cars only learn whose spawn they stand in for from the snapshot.
+_SPAWN_FIELDS = ('startX', 'startY')
+
+# One row per car: every field that decides how the race goes on.
+SNAPSHOT_DTYPE = np.dtype(
+    [(name, np.float64) for name in _FLOAT_FIELDS]
+    + [(name, np.bool_) for name in _BOOL_FIELDS]
+    + [(name, np.int64) for name in _INT_FIELDS]
+    + list(_GAME_FIELDS)
+    + [(name, np.float64) for name in _SPAWN_FIELDS]
+)
+
+# Timestamps in game ticks. Restoring onto a clock that cannot be set moves
+# them by the same amount, so every timer keeps its time left relative to
+# now. The first group uses 0 for "not set" and keeps it.
+_OPTIONAL_TIMERS = ('_boost_request_time', '_boost_start_time', '_collision_end_time')
+_TIMERS = ('_last_time', '_lap_start_time')
+
+
+class GameSnapshot:
+    __slots__ = ('cars', 'steps', 'time_ms', 'lap_times')
+
+    def __init__(self, cars, steps, time_ms, lap_times):
+        self.cars = cars
+        self.steps = steps
+        self.time_ms = time_ms
+        self.lap_times = lap_times
+
+    def __len__(self):
+        return len(self.cars)
+
+    @property
+    def nbytes(self):
+        return self.cars.nbytes
+
+    def progress(self, track):
+        # Laps completed plus the fraction of the current lap, per car.
+        field = track.distance_field
+        cars = self.cars
+        if field.num_checkpoints == 0:
+            return cars['_laps_completed'].astype(np.float64)
+        frac = field.lap_progress_many(cars['_next_checkpoint'], cars['_x'], cars['_y'])
+        return cars['_laps_completed'] + frac
+
+
+def capture(game):
+    n = len(game._cars)
+    cars = np.empty(n, dtype=SNAPSHOT_DTYPE)
+    for name in _CAR_FIELDS:
+        cars[name] = game._car_values(name)
+    for name, _ in _GAME_FIELDS:
+        cars[name] = getattr(game, name)
+    for name in _SPAWN_FIELDS:
+        cars[name] = [getattr(car, name) for car in game._cars]
+    lap_times = tuple(tuple(t) for t in game._lap_times)
+    return GameSnapshot(cars, game._steps, game.get_ticks(), lap_times)
+
+
+def restore(game, snap):
+    cars = snap.cars
+    if len(cars) != len(game._cars):
+        raise ValueError(f"Snapshot has {len(cars)} cars, game has {len(game._cars)}")
+    clock = game._sim_clock
+    if isinstance(clock, SimClock):
+        clock.set_ticks(snap.time_ms)
+        shift = 0.0
+    else:
+        shift = game.get_ticks() - snap.time_ms
+
+    if shift:
+        cars = cars.copy()
+        for name in _OPTIONAL_TIMERS:
+            col = cars[name]
+            col[col != 0] += shift
+        for name in _TIMERS:
+            cars[name] += shift
+
+    if game._fleet is not None:
+        n = game._fleet.count
+        arrays = game._fleet.arrays
+        for name in _CAR_FIELDS:
+            arrays[name][:n] = cars[name]
+    else:
+        columns = {name: cars[name].tolist() for name in _CAR_FIELDS}
+        for idx, car in enumerate(game._cars):
+            for name in _CAR_FIELDS:
+                setattr(car, name, columns[name][idx])
+            car._hitbox.center = (car._x, car._y)
+    spawns = zip(*(cars[name].tolist() for name in _SPAWN_FIELDS))
+    for car, (start_x, start_y) in zip(game._cars, spawns):
+        car.startX = start_x
+        car.startY = start_y
+        car._obs = None
+
+    for name, _ in _GAME_FIELDS:
+        getattr(game, name)[:] = cars[name]
+    game._lap_times = [list(t) for t in snap.lap_times]
+    game._steps = snap.steps
+    game._obs_buffer_tick = -1
+    game._rays_tick = -1
+    game._rebuild_grid()
+
+
+def tile(snap, k):
+    # k copies of a snapshot side by side, branch-major, for a fork game.
+    return GameSnapshot(np.tile(snap.cars, k), snap.steps, snap.time_ms, snap.lap_times * k)
+
+
+class Forker:
+    # Runs K branches of an N-car race at once in one game of K * N cars,
+    # on the same engine as the game being forked. Contacts are only
+    # resolved between cars of the same branch, so branches never see
+    # each other.
+    def __init__(self, track, num_cars, branches, dt_ms, vectorized=True):
+        from env.game import F1Game
+        self.num_cars = num_cars
+        self.branches = branches
+        self.game = F1Game(model_dirs=[str(i) for i in range(num_cars * branches)], headless=True,
+                           fixed_dt_ms=dt_ms, vectorized=vectorized, track=track)
+        self.game._contact_group = num_cars
+        self._lap_col = OBS_INDEX['lap_progress']
+
+    def run(self, snap, actions, car=None, others=None):
+        # actions: (K, H) action indices for `car`, or (K, H, N) for every
+        # car. With (K, H) the other cars hold the actions in `others`, an
+        # (N,) or (K, N) array, or get no input; -1 means no input.
+        # Returns (snapshots, progress) where progress is (K, H, N) laps
+        # plus lap fraction after each step.
+        game = self.game
+        k, n = self.branches, self.num_cars
+        actions = np.asarray(actions, dtype=np.int64)
+        horizon = actions.shape[1]
+        if actions.ndim == 2:
+            full = np.full((k, horizon, n), -1, dtype=np.int64)
+            if others is not None:
+                full[:] = np.broadcast_to(np.asarray(others, dtype=np.int64), (k, n))[:, None, :]
+            full[:, :, 0 if car is None else car] = actions
+            actions = full
+        # branch-major, matching tile()
+        per_step = actions.transpose(1, 0, 2).reshape(horizon, k * n)
+
+        restore(game, tile(snap, k))
+        # The snapshot may carry bits applied after its last step.
+        game._clear_controls()
+        progress = np.empty((horizon, k * n), dtype=np.float64)
+        for step in range(horizon):
+            for target, action in zip(game._cars, per_step[step].tolist()):
+                if action >= 0:
+                    apply_action(target, action)
+            game.step()
+            progress[step] = game._laps_completed + game.observations()[:, self._lap_col]
+
+        branches = capture(game)
+        snaps = [GameSnapshot(branches.cars[b * n:(b + 1) * n].copy(), branches.steps, branches.time_ms,
+                              branches.lap_times[b * n:(b + 1) * n]) for b in range(k)]
+        return snaps, progress.reshape(horizon, k, n).transpose(1, 0, 2)
@@ -0,0 +1,69 @@
+import numpy as np
+
+_STRIDE = 1 << 20
+
+
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self.xs = np.zeros(0)
+        self.ys = np.zeros(0)
+
+    def _cell(self, v):
+        return int(np.floor(v / self.cell_size))
+
+    def rebuild(self, xs, ys):
+        self.xs = np.array(xs, dtype=np.float64)
+        self.ys = np.array(ys, dtype=np.float64)
+        self._cells = {}
+        if self.xs.size == 0:
+            return
+        cx = np.floor(self.xs / self.cell_size).astype(np.int64)
+        cy = np.floor(self.ys / self.cell_size).astype(np.int64)
+        keys = cx * _STRIDE + cy
+        order = np.argsort(keys, kind='stable')
+        uniq, starts = np.unique(keys[order], return_index=True)
+        bounds = np.append(starts, order.size)
+        for n, key in enumerate(uniq.tolist()):
+            self._cells[key] = order[bounds[n]:bounds[n + 1]]
+
+    def candidates(self, x0, y0, x1, y1):
+        found = []
+        for cx in range(self._cell(x0), self._cell(x1) + 1):
+            for cy in range(self._cell(y0), self._cell(y1) + 1):
+                idx = self._cells.get(cx * _STRIDE + cy)
+                if idx is not None:
+                    found.append(idx)
+        if not found:
+            return np.zeros(0, dtype=np.intp)
+        return np.sort(np.concatenate(found))
+
+    def candidate_pairs(self, reach):
+        span = int(np.ceil(reach / self.cell_size))
+        firsts = []
+        seconds = []
+        for key, idx in self._cells.items():
+            cx, cy = divmod(key, _STRIDE)
+            if cy > _STRIDE // 2:
+                cx += 1
+                cy -= _STRIDE
+            near = []
+            for ox in range(-span, span + 1):
+                for oy in range(-span, span + 1):
+                    other = self._cells.get((cx + ox) * _STRIDE + (cy + oy))
+                    if other is not None:
+                        near.append(other)
+            near = np.concatenate(near)
+            i = np.repeat(idx, near.size)
+            j = np.tile(near, idx.size)
+            keep = (i != j) & (np.abs(self.xs[i] - self.xs[j]) <= reach) & (np.abs(self.ys[i] - self.ys[j]) <= reach)
+            firsts.append(i[keep])
+            seconds.append(j[keep])
+        if not firsts:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+        i = np.concatenate(firsts)
+        j = np.concatenate(seconds)
+        order = np.lexsort((j, i))
+        return i[order], j[order]
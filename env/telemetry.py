@@ -0,0 +1,258 @@
+import json
+import math
+import os
+import socket
+import threading
+from pathlib import Path
+import numpy as np
+from car.observation import OBS_FIELDS
+
+TELEMETRY_FIELDS = OBS_FIELDS + ('last_lap_time',)
+
+
+class TelemetryRing:
+    # Single-producer / single-consumer ring. The game thread only ever
+    # advances head and the drain thread only ever advances tail; each slot
+    # is written before head moves past it, so neither side needs a lock.
+    def __init__(self, capacity, num_cars, num_fields=len(TELEMETRY_FIELDS)):
+        self.capacity = int(capacity)
+        self.values = np.zeros((self.capacity, num_cars, num_fields), dtype=np.float32)
+        self.ticks = np.zeros(self.capacity, dtype=np.int64)
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, tick, time_ms, obs, last_lap_time):
+        if self.head - self.tail >= self.capacity:
+            self.dropped += 1
+            return False
+        slot = self.head % self.capacity
+        row = self.values[slot]
+        row[:, :obs.shape[1]] = obs
+        row[:, obs.shape[1]] = last_lap_time
+        self.ticks[slot] = tick
+        self.times[slot] = time_ms
+        self.head += 1
+        return True
+
+    def pop_all(self):
+        head = self.head
+        tail = self.tail
+        if head == tail:
+            return None
+        idx = np.arange(tail, head) % self.capacity
+        batch = {
+            'ticks': self.ticks[idx],
+            'time_ms': self.times[idx],
+            'values': self.values[idx],
+        }
+        self.tail = head
+        return batch
+
+
+class NDJSONSink:
+    # One JSON object per tick: {"tick", "time_ms", "cars": [{field: value}]}.
+    def __init__(self, path):
+        self._file = open(path, 'a', buffering=1 << 16)
+
+    def write(self, batch, fields):
+        self._file.write(_ndjson(batch, fields))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SocketSink:
+    # Streams the same NDJSON lines to a dashboard listening on a Unix or
+    # TCP socket. While an earlier batch is still only partly sent, new
+    # batches are dropped; a lost connection is retried on later batches.
+    def __init__(self, address, retry_batches=20):
+        self.address = address
+        self.retry_batches = retry_batches
+        self.dropped = 0
+        self._sock = None
+        self._pending = b''
+        self._wait = 0
+        self._connect()
+
+    def _connect(self):
+        kind, _, where = self.address.partition(':')
+        try:
+            if kind == 'unix':
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(where)
+            else:
+                host, _, port = where.rpartition(':')
+                sock = socket.create_connection((host or 'localhost', int(port)), timeout=1.0)
+            sock.setblocking(False)
+            self._sock = sock
+            self._pending = b''
+        except OSError:
+            self._sock = None
+            self._wait = self.retry_batches
+
+    def write(self, batch, fields):
+        if self._sock is None:
+            if self._wait > 0:
+                self._wait -= 1
+                self.dropped += len(batch['ticks'])
+                return
+            self._connect()
+            if self._sock is None:
+                self.dropped += len(batch['ticks'])
+                return
+        try:
+            if self._pending:
+                self._pending = self._pending[self._sock.send(self._pending):]
+            if self._pending:
+                self.dropped += len(batch['ticks'])
+                return
+            data = _ndjson(batch, fields).encode('utf-8')
+            self._pending = data[self._sock.send(data):]
+        except BlockingIOError:
+            self.dropped += len(batch['ticks'])
+        except OSError:
+            self._sock.close()
+            self._sock = None
+            self.dropped += len(batch['ticks'])
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class ColumnarSink:
+    # A directory with one append-only binary file per column plus a
+    # meta.json describing them; read back with read_columnar().
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._files = {}
+
+    def _open(self, fields, num_cars):
+        meta = {'fields': list(fields), 'num_cars': num_cars,
+                'dtypes': {'ticks': 'int64', 'time_ms': 'float64', 'fields': 'float32'}}
+        (self.path / 'meta.json').write_text(json.dumps(meta))
+        for name in ('ticks', 'time_ms') + tuple(fields):
+            self._files[name] = open(self.path / (name + '.bin'), 'ab')
+
+    def write(self, batch, fields):
+        values = batch['values']
+        if not self._files:
+            self._open(fields, values.shape[1])
+        self._files['ticks'].write(batch['ticks'].tobytes())
+        self._files['time_ms'].write(batch['time_ms'].tobytes())
+        for col, name in enumerate(fields):
+            self._files[name].write(np.ascontiguousarray(values[:, :, col]).tobytes())
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def read_columnar(path):
+    path = Path(path)
+    meta = json.loads((path / 'meta.json').read_text())
+    cars = meta['num_cars']
+    columns = {
+        'ticks': np.fromfile(path / 'ticks.bin', dtype=np.int64),
+        'time_ms': np.fromfile(path / 'time_ms.bin', dtype=np.float64),
+    }
+    n = len(columns['ticks'])
+    for name in meta['fields']:
+        file = path / (name + '.bin')
+        if os.path.getsize(file):
+            columns[name] = np.memmap(file, dtype=np.float32, mode='r')[:n * cars].reshape(n, cars)
+        else:
+            columns[name] = np.zeros((0, cars), dtype=np.float32)
+    return columns
+
+
+def _ndjson(batch, fields):
+    lines = []
+    for tick, time_ms, values in zip(batch['ticks'].tolist(), batch['time_ms'].tolist(), batch['values'].tolist()):
+        cars = [{name: (None if math.isnan(v) else v) for name, v in zip(fields, row)} for row in values]
+        lines.append(json.dumps({'tick': tick, 'time_ms': time_ms, 'cars': cars}))
+    return '\n'.join(lines) + '\n'
+
+
+def open_sink(spec):
+    # "ndjson:PATH", "columnar:DIR", "tcp:HOST:PORT" or "unix:PATH".
+    kind, _, where = spec.partition(':')
+    if kind == 'ndjson':
+        return NDJSONSink(where)
+    if kind == 'columnar':
+        return ColumnarSink(where)
+    if kind in ('tcp', 'unix'):
+        return SocketSink(spec)
+    raise ValueError("Unknown telemetry sink " + repr(spec))
+
+
+class TelemetryPublisher:
+    def __init__(self, num_cars, sinks, capacity=1024, interval=0.05, max_stride=64):
+        self.fields = TELEMETRY_FIELDS
+        self._ring = TelemetryRing(capacity, num_cars)
+        self._sinks = list(sinks)
+        self._interval = float(interval)
+        self.max_stride = int(max_stride)
+        self.stride = 1
+        self.published = 0
+        self.sink_errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._drain_loop, name='telemetry', daemon=True)
+        self._thread.start()
+
+    def publish(self, game):
+        # Called from the game loop; never blocks. When the drain thread
+        # falls behind, every stride-th tick is kept, and when the ring is
+        # full the tick is dropped outright.
+        tick = game._steps
+        ring = self._ring
+        fill = len(ring) / ring.capacity
+        if fill > 0.75:
+            self.stride = min(self.stride * 2, self.max_stride)
+        elif fill < 0.25 and self.stride > 1:
+            self.stride //= 2
+        if tick % self.stride:
+            return
+        if ring.push(tick, game.get_ticks(), game.observations(), game._last_lap_time):
+            self.published += 1
+
+    def _drain(self):
+        batch = self._ring.pop_all()
+        if batch is None:
+            return
+        for sink in self._sinks:
+            try:
+                sink.write(batch, self.fields)
+            except Exception:
+                self.sink_errors += 1
+
+    def _drain_loop(self):
+        while not self._stop.wait(self._interval):
+            self._drain()
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'dropped': self._ring.dropped,
+            'stride': self.stride,
+            'sink_errors': self.sink_errors,
+            'sink_dropped': sum(getattr(s, 'dropped', 0) for s in self._sinks),
+        }
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        for sink in self._sinks:
+            sink.close()
@@ -0,0 +1,79 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+
+from env.controls import apply_action
+from env.game import F1Game
+from env.snapshot import Forker, restore, tile
+
+CARS = 4
+DT_MS = 1000.0 / 60.0
+
+
+def _game(vectorized):
+    return F1Game(model_dirs=[str(i) for i in range(CARS)], headless=True, fixed_dt_ms=DT_MS,
+                  vectorized=vectorized)
+
+
+def _play(game, actions):
+    for row in actions.tolist():
+        for car, action in zip(game._cars, row):
+            apply_action(car, action)
+        game.step()
+    return (game.observations().copy(), game._laps_completed.copy(),
+            [list(times) for times in game._lap_times], game.get_ticks())
+
+
+@pytest.fixture
+def actions():
+    return np.random.default_rng(0).integers(0, 7, (400, CARS))
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_restore_replays_identically(vectorized, actions):
+    game = _game(vectorized)
+    _play(game, actions[:150])
+    snap = game.snapshot()
+    first = _play(game, actions[150:])
+    game.restore(snap)
+    assert game._steps == snap.steps
+    second = _play(game, actions[150:])
+    np.testing.assert_array_equal(first[0], second[0])
+    np.testing.assert_array_equal(first[1], second[1])
+    assert first[2] == second[2]
+    assert first[3] == second[3]
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_fork_matches_playing_forward(vectorized, actions):
+    game = _game(vectorized)
+    _play(game, actions[:150])
+    snap = game.snapshot()
+    # Branch 0 plays the real actions, the others hold car 0 still.
+    branches = np.stack([actions[150:]] * 3)
+    branches[1:, :, 0] = 0
+    snaps, progress = game.fork(branches)
+    assert game._steps == snap.steps
+    assert progress.shape == (3, len(actions) - 150, CARS)
+
+    _play(game, actions[150:])
+    played = game.snapshot()
+    for name in ('_x', '_y', '_angle', '_velocity', '_laps_completed', '_next_checkpoint'):
+        np.testing.assert_array_equal(snaps[0].cars[name], played.cars[name])
+    # Branches 1 and 2 play the same actions and never see each other.
+    np.testing.assert_array_equal(snaps[1].cars['_x'], snaps[2].cars['_x'])
+    np.testing.assert_array_equal(progress[1], progress[2])
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_reset_after_restore_uses_own_spawn(vectorized):
+    game = _game(vectorized)
+    spawns = [(car.startX, car.startY) for car in game._cars]
+    forker = Forker(game._track, CARS, 2, DT_MS, vectorized)
+    restore(forker.game, tile(game.snapshot(), 2))
+    for car in forker.game._cars:
+        car.reset()
+    assert [car.get_position() for car in forker.game._cars] == spawns * 2
@@ -1,39 +1,120 @@
 import pygame
 import numpy as np
-from env.constants import CELL_SIZE
+from env.constants import (CELL_SIZE, LARGE_TRACK_CELLS, RASTER_TILE_SIZE, RAY_ANGLES, RAY_MAX_RANGE,
+                           TRACK_CHUNK_SIZE)
 from env.race_track import board
+from env.chunked import ChunkedGrid
+from env.distance_field import DistanceField
+from env.sensors import cast_rays, wall_distance_bands
+from env.track_cache import (CACHE_DIR, CHECKPOINT_LUT, COLLISION_LUT, COLOR_LUT, compile_board, compile_chunked,
+                             load_compiled, read_board, read_cache)
 
 board = board
 
 class Track:
-    def __init__(self):
+    def __init__(self, board=board, cache=True, cache_dir=CACHE_DIR, chunk='auto'):
         self.board = board
         self.height = len(board)
         self.width = len(board[0])
+        # Boards past LARGE_TRACK_CELLS keep their masks as ChunkedGrids;
+        # chunk=None forces dense arrays, an int forces that chunk size.
+        if chunk == 'auto':
+            chunk = TRACK_CHUNK_SIZE if self.width * self.height > LARGE_TRACK_CELLS else None
+        self.chunk = chunk
+        self._cells = None
         self.collision_mask = None
+        self.checkpoint_grid = None
         self.checkpoints = {}
+        self.checkpoint_ids = []
+        self.num_checkpoints = 0
         self.start_pos = None
         self.spawn_positions = []
-        self._parse_track()
-        
+        self._colors = None
+        self._tiles = {}
+        self._tiles_zoom = None
+        self._distance_field = None
+        self._wall_distance = None
+        self._cache_path = None
+        if cache:
+            compiled, self._cache_path = load_compiled(self.board, cache_dir, self.chunk)
+            self._load_compiled(compiled)
+        else:
+            self._parse_track()
+
+    @classmethod
+    def from_file(cls, path, cache=True, cache_dir=CACHE_DIR, chunk='auto'):
+        return cls(read_board(path), cache=cache, cache_dir=cache_dir, chunk=chunk)
+
     def _parse_track(self):
-        self.collision_mask = np.zeros((self.height, self.width), dtype=bool)
-        
-        for y, row in enumerate(self.board):
-            for x, cell in enumerate(row):
-                if cell == '#':
-                    self.collision_mask[y, x] = True
-                elif cell in ('p', 'q', 'r', 's', 'a', 'b', 'c', 'd'):
-                    pos = (x * CELL_SIZE + CELL_SIZE // 2, y * CELL_SIZE + CELL_SIZE // 2)
-                    self.spawn_positions.append(pos)
-                    if cell == 'p' and not self.start_pos:
-                        self.start_pos = pos
-                elif cell.isdigit():
-                    checkpoint_id = int(cell)
-                    if checkpoint_id not in self.checkpoints:
-                        self.checkpoints[checkpoint_id] = []
-                    self.checkpoints[checkpoint_id].append((x, y))
+        self._load_compiled(compile_chunked(self.board, self.chunk) if self.chunk else compile_board(self.board))
+
+    def _attach(self, compiled):
+        if 'cells_blocks' in compiled:
+            self._cells = ChunkedGrid.from_arrays(compiled, 'cells')
+            self.collision_mask = self._cells.map(COLLISION_LUT)
+            self.checkpoint_grid = self._cells.map(CHECKPOINT_LUT)
+            self._colors = None
+        else:
+            self.collision_mask = compiled['collision_mask']
+            self.checkpoint_grid = compiled['checkpoint_grid']
+            self._colors = compiled['colors']
+
+    def _load_compiled(self, compiled):
+        self._attach(compiled)
+        self.spawn_positions = [tuple(pos) for pos in compiled['spawns'].tolist()]
+        start = int(compiled['start_index'][0])
+        self.start_pos = self.spawn_positions[start] if start >= 0 else None
+
+        if self._cells is not None:
+            ids, xs, ys = compiled['checkpoint_cells'].T
+        else:
+            ys, xs = np.nonzero(self.checkpoint_grid >= 0)
+            ids = self.checkpoint_grid[ys, xs]
+        self.checkpoints = {}
+        for cid in np.unique(ids).tolist():
+            hit = ids == cid
+            self.checkpoints[cid] = list(zip(xs[hit].tolist(), ys[hit].tolist()))
+        self.checkpoint_ids = sorted(self.checkpoints)
+        self.num_checkpoints = len(self.checkpoint_ids)
     
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_tiles'] = {}
+        state['_tiles_zoom'] = None
+        if self._cache_path is not None:
+            # Workers re-map the compiled file instead of receiving copies.
+            for name in ('collision_mask', 'checkpoint_grid', '_colors', '_cells'):
+                state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._cache_path is not None and self.collision_mask is None:
+            self._attach(read_cache(self._cache_path))
+
+    @property
+    def distance_field(self):
+        if self._distance_field is None:
+            self._distance_field = DistanceField(self)
+        return self._distance_field
+
+    @property
+    def wall_distance(self):
+        # Capped just past what one ray step can use at RAY_MAX_RANGE.
+        # Chunked tracks keep it as a float32 ChunkedGrid built band by
+        # band, so the whole board is never held densely.
+        if self._wall_distance is None:
+            cap = -(-RAY_MAX_RANGE // CELL_SIZE) + 2
+            if self.chunk:
+                bands = wall_distance_bands(self.collision_mask, self.chunk, cap)
+                self._wall_distance = ChunkedGrid.from_bands((self.height, self.width), self.chunk, bands)
+            else:
+                self._wall_distance = next(wall_distance_bands(self.collision_mask, self.height, cap))
+        return self._wall_distance
+
+    def cast_rays(self, xs, ys, headings, ray_angles=RAY_ANGLES, max_range=RAY_MAX_RANGE):
+        return cast_rays(self, xs, ys, headings, ray_angles, max_range)
+
     def check_collision(self, x, y):
         grid_x = int(x / CELL_SIZE)
         grid_y = int(y / CELL_SIZE)
@@ -43,6 +124,14 @@ class Track:
         
         return self.collision_mask[grid_y, grid_x]
     
+    def check_collisions(self, xs, ys):
+        gx = (np.asarray(xs) / CELL_SIZE).astype(np.intp)
+        gy = (np.asarray(ys) / CELL_SIZE).astype(np.intp)
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        hits = np.ones(gx.shape, dtype=bool)
+        hits[inside] = self.collision_mask[gy[inside], gx[inside]]
+        return hits
+
     def check_checkpoint(self, x, y):
         grid_x = int(x / CELL_SIZE)
         grid_y = int(y / CELL_SIZE)
@@ -50,38 +139,67 @@ class Track:
         if grid_x < 0 or grid_x >= self.width or grid_y < 0 or grid_y >= self.height:
             return None
         
-        cell = self.board[grid_y][grid_x]
-        if cell.isdigit():
-            return int(cell)
-        return None
+        checkpoint_id = self.checkpoint_grid[grid_y, grid_x]
+        if checkpoint_id < 0:
+            return None
+        return int(checkpoint_id)
+
+    def check_checkpoints(self, xs, ys):
+        gx = (np.asarray(xs) / CELL_SIZE).astype(np.intp)
+        gy = (np.asarray(ys) / CELL_SIZE).astype(np.intp)
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        ids = np.full(gx.shape, -1, dtype=np.int16)
+        ids[inside] = self.checkpoint_grid[gy[inside], gx[inside]]
+        return ids
     
+    def _get_tile(self, i, j, zoom):
+        tile = self._tiles.get((i, j))
+        if tile is not None:
+            return tile
+        scale = CELL_SIZE * zoom
+        px = np.arange(i * RASTER_TILE_SIZE, (i + 1) * RASTER_TILE_SIZE)
+        py = np.arange(j * RASTER_TILE_SIZE, (j + 1) * RASTER_TILE_SIZE)
+        px = px[px < int(self.width * scale)]
+        py = py[py < int(self.height * scale)]
+        cx = np.minimum((px / scale).astype(np.intp), self.width - 1)
+        cy = np.minimum((py / scale).astype(np.intp), self.height - 1)
+        if self._cells is not None:
+            colors = COLOR_LUT[self._cells.take(cy[None, :], cx[:, None])]
+        else:
+            colors = self._colors[cx][:, cy]
+        tile = pygame.surfarray.make_surface(colors)
+        if pygame.display.get_surface() is not None:
+            tile = tile.convert()
+        self._tiles[(i, j)] = tile
+        return tile
+
     def render(self, screen, camera=None):
-        for y in range(self.height):
-            for x in range(self.width):
-                cell = self.board[y][x]
-                color = None
-                
-                if cell == '#':
-                    color = (100, 100, 100)
-                elif cell == '.':
-                    color = (50, 50, 50)
-                elif cell == 'p':
-                    color = (0, 255, 0)
-                elif cell.isdigit():
-                    color = (255, 255, 0)
-                
-                if color:
-                    world_x = x * CELL_SIZE
-                    world_y = y * CELL_SIZE
-                    if camera:
-                        sx = int((world_x - camera.offset_x) * camera.zoom)
-                        sy = int((world_y - camera.offset_y) * camera.zoom)
-                        size = max(1, int(CELL_SIZE * camera.zoom))
-                        screen_rect = (sx, sy, size, size)
-                    else:
-                        screen_rect = (world_x, world_y, CELL_SIZE, CELL_SIZE)
-                    pygame.draw.rect(screen, color, screen_rect)
-    
+        if camera:
+            zoom = camera.zoom
+            off_x = int(camera.offset_x * zoom)
+            off_y = int(camera.offset_y * zoom)
+        else:
+            zoom = 1.0
+            off_x = 0
+            off_y = 0
+
+        if zoom != self._tiles_zoom:
+            self._tiles = {}
+            self._tiles_zoom = zoom
+
+        size = RASTER_TILE_SIZE
+        cols = -(-int(self.width * CELL_SIZE * zoom) // size)
+        rows = -(-int(self.height * CELL_SIZE * zoom) // size)
+        screen_w, screen_h = screen.get_size()
+        i0 = max(0, off_x // size)
+        j0 = max(0, off_y // size)
+        i1 = min(cols, (off_x + screen_w) // size + 1)
+        j1 = min(rows, (off_y + screen_h) // size + 1)
+
+        for j in range(j0, j1):
+            for i in range(i0, i1):
+                screen.blit(self._get_tile(i, j, zoom), (i * size - off_x, j * size - off_y))
+
     def get_start_position(self):
         if self.start_pos:
             return self.start_pos
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+from env.chunked import ChunkedGrid
+from env.constants import CELL_SIZE
+
+MAGIC = b'EXMLTRK1'
+VERSION = 1
+_ALIGN = 64
+
+CACHE_DIR = Path(os.environ.get('EXML_TRACK_CACHE', Path(__file__).resolve().parent.parent / '.track_cache'))
+
+SPAWN_CELLS = 'pqrsabcd'
+_COLORS = (
+    ('#', (100, 100, 100)),
+    ('.', (50, 50, 50)),
+    ('p', (0, 255, 0)),
+)
+_CHECKPOINT_COLOR = (255, 255, 0)
+
+# Per-byte lookups from board cells, used by the chunked large-track layout.
+COLLISION_LUT = np.zeros(256, dtype=bool)
+COLLISION_LUT[ord('#')] = True
+CHECKPOINT_LUT = np.full(256, -1, dtype=np.int16)
+CHECKPOINT_LUT[ord('0'):ord('9') + 1] = np.arange(10)
+COLOR_LUT = np.zeros((256, 3), dtype=np.uint8)
+for _cell, _color in _COLORS:
+    COLOR_LUT[ord(_cell)] = _color
+COLOR_LUT[ord('0'):ord('9') + 1] = _CHECKPOINT_COLOR
+_SPAWN_LUT = np.zeros(256, dtype=bool)
+_SPAWN_LUT[np.frombuffer(SPAWN_CELLS.encode('ascii'), dtype=np.uint8)] = True
+
+
+def read_board(path):
+    with open(path, 'r') as f:
+        rows = [line.rstrip('\r\n') for line in f]
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def board_grid(board):
+    width = len(board[0])
+    if any(len(row) != width for row in board):
+        raise ValueError("Track rows must all have the same length")
+    return np.frombuffer(''.join(board).encode('ascii'), dtype=np.uint8).reshape(len(board), width)
+
+
+def board_key(board):
+    digest = hashlib.sha256()
+    digest.update(b'%d:%d:%d\n' % (VERSION, CELL_SIZE, len(board)))
+    for row in board:
+        digest.update(row.encode('ascii'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def compile_board(board):
+    cells = board_grid(board)
+    is_digit = (cells >= ord('0')) & (cells <= ord('9'))
+
+    checkpoint_grid = np.where(is_digit, cells.astype(np.int16) - ord('0'), -1).astype(np.int16)
+    spawn_y, spawn_x = np.nonzero(np.isin(cells, np.frombuffer(SPAWN_CELLS.encode('ascii'), dtype=np.uint8)))
+    spawns = np.stack((spawn_x * CELL_SIZE + CELL_SIZE // 2, spawn_y * CELL_SIZE + CELL_SIZE // 2), axis=1)
+    start = np.flatnonzero(cells[spawn_y, spawn_x] == ord('p'))
+
+    colors = np.zeros(cells.shape + (3,), dtype=np.uint8)
+    for cell, color in _COLORS:
+        colors[cells == ord(cell)] = color
+    colors[is_digit] = _CHECKPOINT_COLOR
+
+    return {
+        'collision_mask': cells == ord('#'),
+        'checkpoint_grid': checkpoint_grid,
+        'spawns': spawns.astype(np.int32).reshape(-1, 2),
+        'start_index': np.array([start[0] if start.size else -1], dtype=np.int32),
+        # Laid out (x, y, rgb) so pygame.surfarray can use it directly.
+        'colors': np.ascontiguousarray(colors.transpose(1, 0, 2)),
+    }
+
+
+def compile_chunked(board, chunk):
+    # Large-track layout: the board itself as a ChunkedGrid of cell bytes,
+    # plus the checkpoint and spawn cells pulled out of the mixed chunks.
+    cells = ChunkedGrid.from_rows(board, chunk)
+    cy, cx, cid = cells.where(lambda v: CHECKPOINT_LUT[v] >= 0)
+    sy, sx, kind = cells.where(lambda v: _SPAWN_LUT[v])
+    spawns = np.stack((sx * CELL_SIZE + CELL_SIZE // 2, sy * CELL_SIZE + CELL_SIZE // 2), axis=1)
+    start = np.flatnonzero(kind == ord('p'))
+    return {
+        **cells.arrays('cells'),
+        'checkpoint_cells': np.stack((CHECKPOINT_LUT[cid], cx, cy), axis=1).astype(np.int32).reshape(-1, 3),
+        'spawns': spawns.astype(np.int32).reshape(-1, 2),
+        'start_index': np.array([start[0] if start.size else -1], dtype=np.int32),
+    }
+
+
+def write_cache(path, arrays):
+    path = Path(path)
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({'version': VERSION, 'arrays': layout}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    # Written to a private name and renamed into place, so workers racing
+    # to compile the same track never see a half-written file.
+    tmp = path.with_name(path.name + '.' + str(os.getpid()) + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+
+def read_cache(path):
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(str(path) + " is not a compiled track")
+    size = int.from_bytes(bytes(data[len(MAGIC):len(MAGIC) + 8]), 'little')
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(data[start:start + size]).decode('utf-8'))
+    if header.get('version') != VERSION:
+        raise ValueError("Unsupported compiled track version")
+    data_start = -(-(start + size) // _ALIGN) * _ALIGN
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count,
+                                     offset=data_start + spec['offset']).reshape(spec['shape'])
+    return arrays
+
+
+def load_compiled(board, cache_dir=CACHE_DIR, chunk=None):
+    # Returns (arrays, cache path). Falls back to an in-memory compile when
+    # the cache directory cannot be written. With chunk set the chunked
+    # large-track layout is compiled and cached under its own name.
+    key = board_key(board) + ('-c%d' % chunk if chunk else '')
+    path = Path(cache_dir) / (key + '.trk')
+    if path.exists():
+        try:
+            return read_cache(path), path
+        except (ValueError, OSError):
+            pass
+    arrays = compile_chunked(board, chunk) if chunk else compile_board(board)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_cache(path, arrays)
+    except OSError:
+        return arrays, None
+    return read_cache(path), path
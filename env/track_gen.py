@@ -0,0 +1,193 @@
+import math
+import numpy as np
+from env.track_cache import SPAWN_CELLS, board_grid
+
+MIN_ROAD_WIDTH = 12
+MAX_CHECKPOINTS = 10
+_BAND_ROWS = 256
+_THETA_STEPS = 1 << 16
+
+
+class _Circuit:
+    # Closed centre line r = s(theta) around the board centre, in a space
+    # stretched by (rx, ry) to fill the board. Star-shaped by construction,
+    # so it never crosses itself. Driving direction is increasing theta,
+    # which is clockwise on screen.
+    def __init__(self, width, height, road_width, rng, harmonics, roughness):
+        k = np.arange(2, harmonics + 2)
+        amp = roughness * rng.uniform(0.4, 1.0, k.size) / k ** 1.5
+        # Keep s(theta) >= 0.4 everywhere.
+        total = amp.sum()
+        if total > 0.6:
+            amp *= 0.6 / total
+        self.k = k
+        self.amp = amp
+        self.phase = rng.uniform(0, 2 * math.pi, k.size)
+        self.road_width = road_width
+        margin = road_width / 2.0 + 3
+        self.cx = (width - 1) / 2.0
+        self.cy = (height - 1) / 2.0
+        top = 1.0 + amp.sum()
+        self.rx = (width / 2.0 - margin) / top
+        self.ry = (height / 2.0 - margin) / top
+        # s and s' tabulated over theta, so rasterizing costs the same per
+        # cell whatever the number of harmonics.
+        grid = np.linspace(-math.pi, math.pi, _THETA_STEPS + 1)
+        self._s = self.s(grid)
+        self._ds = self.ds(grid)
+
+    def s(self, theta):
+        return 1.0 + (self.amp * np.cos(self.k * theta[..., None] + self.phase)).sum(axis=-1)
+
+    def ds(self, theta):
+        return (-self.amp * self.k * np.sin(self.k * theta[..., None] + self.phase)).sum(axis=-1)
+
+    def point(self, theta):
+        theta = np.asarray(theta, dtype=np.float64)
+        r = self.s(theta)
+        return self.cx + self.rx * r * np.cos(theta), self.cy + self.ry * r * np.sin(theta)
+
+    def tangent(self, theta):
+        theta = np.asarray(theta, dtype=np.float64)
+        r = self.s(theta)
+        dr = self.ds(theta)
+        tx = self.rx * (dr * np.cos(theta) - r * np.sin(theta))
+        ty = self.ry * (dr * np.sin(theta) + r * np.cos(theta))
+        norm = np.hypot(tx, ty)
+        return tx / norm, ty / norm
+
+    def distance(self, xs, ys):
+        # First-order distance to the centre line in cells: |f| / |grad f|
+        # with f = rho - s(theta) in the stretched space.
+        u = (xs - self.cx) / self.rx
+        v = (ys - self.cy) / self.ry
+        rho = np.maximum(np.hypot(u, v), 1e-9)
+        i = ((np.arctan2(v, u) + math.pi) * (_THETA_STEPS / (2 * math.pi)) + 0.5).astype(np.intp)
+        f = np.abs(rho - self._s[i])
+        dr = self._ds[i]
+        fx = (u / rho + dr * v / (rho * rho)) / self.rx
+        fy = (v / rho - dr * u / (rho * rho)) / self.ry
+        d = f / np.hypot(fx, fy)
+        # The linearisation breaks down far from the line (near the centre
+        # the gradient blows up); those cells are nowhere near the road.
+        d[f * min(self.rx, self.ry) > 4 * self.road_width] = np.inf
+        return d
+
+
+def _road_mask(circuit, width, height, road_width):
+    road = np.zeros((height, width), dtype=bool)
+    xs = np.arange(width, dtype=np.float64)
+    for y0 in range(0, height, _BAND_ROWS):
+        ys = np.arange(y0, min(height, y0 + _BAND_ROWS), dtype=np.float64)
+        road[y0:y0 + len(ys)] = circuit.distance(xs[None, :], ys[:, None]) <= road_width / 2.0
+    return road
+
+
+def _single_ring(circuit, road, rays=720):
+    # Walking out from the centre along any ray must cross the road exactly
+    # once; a pinch that merged two stretches of road shows up as two.
+    # Gaps of under two cells are raster noise where a ray grazes the edge.
+    h, w = road.shape
+    theta = np.linspace(0, 2 * math.pi, rays, endpoint=False)
+    reach = np.arange(0, max(h, w), 0.5)
+    px = circuit.cx + np.cos(theta)[:, None] * reach[None, :]
+    py = circuit.cy + np.sin(theta)[:, None] * reach[None, :]
+    inside = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+    on = np.zeros((rays, reach.size + 2), dtype=np.int8)
+    on[:, 1:-1][inside] = road[py[inside].astype(np.intp), px[inside].astype(np.intp)]
+    for row in np.diff(on, axis=1):
+        starts = np.flatnonzero(row == 1)
+        ends = np.flatnonzero(row == -1)
+        if starts.size == 0 or 1 + int((starts[1:] - ends[:-1] >= 4).sum()) != 1:
+            return False
+    return True
+
+
+def _line_cells(circuit, theta, road, road_width):
+    # Road cells on a two-cell-thick line across the road at theta.
+    x0, y0 = circuit.point(theta)
+    tx, ty = circuit.tangent(theta)
+    reach = int(road_width) + 2
+    h, w = road.shape
+    gx0, gx1 = max(0, int(x0) - reach), min(w, int(x0) + reach + 1)
+    gy0, gy1 = max(0, int(y0) - reach), min(h, int(y0) + reach + 1)
+    ys, xs = np.mgrid[gy0:gy1, gx0:gx1]
+    along = (xs - x0) * tx + (ys - y0) * ty
+    across = (xs - x0) * ty - (ys - y0) * tx
+    hit = (np.abs(along) <= 1.0) & (np.abs(across) <= road_width) & road[ys, xs]
+    return ys[hit], xs[hit]
+
+
+def generate_board(width, height, seed=0, road_width=None, checkpoints=MAX_CHECKPOINTS,
+                   harmonics=6, roughness=0.6, attempts=8):
+    # A closed circuit in the race_track encoding: '#' walls either side of
+    # the road, '.' everywhere else, checkpoint lines 0..checkpoints-1 in
+    # driving order (the last one is the start/finish line) and spawns
+    # p q r s / a b c d on the grid just past it, facing up.
+    if not 1 <= checkpoints <= MAX_CHECKPOINTS:
+        raise ValueError(f"checkpoints must be between 1 and {MAX_CHECKPOINTS}")
+    if road_width is None:
+        road_width = max(MIN_ROAD_WIDTH, min(width, height) // 25)
+    if min(width, height) < 4 * road_width + 8:
+        raise ValueError("Board too small for road width " + str(road_width))
+    rng = np.random.default_rng(seed)
+
+    for _ in range(attempts):
+        circuit = _Circuit(width, height, road_width, rng, harmonics, roughness)
+        road = _road_mask(circuit, width, height, road_width)
+        if _single_ring(circuit, road):
+            break
+        roughness *= 0.7
+    else:
+        raise ValueError("Could not generate a clean circuit; try a wider board or lower roughness")
+
+    cells = np.full((height, width), ord('.'), dtype=np.uint8)
+    near = road.copy()
+    near[1:] |= road[:-1]
+    near[:-1] |= road[1:]
+    near[:, 1:] |= near[:, :-1].copy()
+    near[:, :-1] |= near[:, 1:].copy()
+    cells[near & ~road] = ord('#')
+
+    # Start where the road runs closest to straight up on the left side.
+    candidates = math.pi + np.linspace(-0.6, 0.6, 121)
+    tx, ty = circuit.tangent(candidates)
+    start = float(candidates[np.argmax(-ty)])
+
+    for cid in range(checkpoints):
+        theta = start + 2 * math.pi * (cid + 1) / checkpoints
+        ys, xs = _line_cells(circuit, theta, road, road_width)
+        cells[ys, xs] = ord('0') + cid
+
+    x0, y0 = circuit.point(start)
+    tx, ty = circuit.tangent(start)
+    nx, ny = -ty, tx
+    lanes = np.linspace(-0.3, 0.3, 4) * road_width
+    for row, letters in ((5, SPAWN_CELLS[:4]), (3, SPAWN_CELLS[4:])):
+        for lane, letter in zip(lanes, letters):
+            x = int(round(x0 + tx * row + nx * lane))
+            y = int(round(y0 + ty * row + ny * lane))
+            cells[y, x] = ord(letter)
+
+    return [row.tobytes().decode('ascii') for row in cells]
+
+
+def validate_board(board):
+    # Cheap structural checks on a board in the race_track encoding.
+    # Returns the checkpoint ids in driving order.
+    cells = board_grid(board)
+    present = np.bincount(cells.ravel(), minlength=256) > 0
+    ids = [cid for cid in range(10) if present[ord('0') + cid]]
+    if not ids:
+        raise ValueError("Track has no checkpoints")
+    if not present[ord('p')]:
+        raise ValueError("Track has no 'p' start position")
+    spawn = np.isin(cells, np.frombuffer(SPAWN_CELLS.encode('ascii'), dtype=np.uint8))
+    if spawn[0].any() or spawn[-1].any() or spawn[:, 0].any() or spawn[:, -1].any():
+        raise ValueError("Track has a spawn on the border")
+    return ids
+
+
+def save_board(board, path):
+    with open(path, 'w') as f:
+        f.write('\n'.join(board) + '\n')
@@ -0,0 +1,153 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from car.observation import OBS_FIELDS, OBS_INDEX
+from env.controls import apply_action
+from env.track import Track
+
+
+def _attach(spec):
+    shm = shared_memory.SharedMemory(name=spec[0])
+    return shm, np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+
+
+def _worker(index, conn, track, specs, cars_per_env, max_steps, max_laps, fixed_dt_ms, vectorized):
+    from env.game import F1Game
+
+    handles = [_attach(spec) for spec in specs]
+    obs, actions, rewards, dones = (arr for _, arr in handles)
+    obs = obs[index]
+    actions = actions[index]
+    rewards = rewards[index]
+    dones = dones[index:index + 1]
+    game = F1Game(model_dirs=[str(i) for i in range(cars_per_env)], headless=True,
+                  fixed_dt_ms=fixed_dt_ms, vectorized=vectorized, track=track)
+    progress_col = OBS_INDEX['lap_progress']
+
+    def progress():
+        return game._laps_completed + game.observations()[:, progress_col]
+
+    last = progress()
+    try:
+        while True:
+            cmd = conn.recv()
+            if cmd == 'step':
+                for car, action in zip(game._cars, actions.tolist()):
+                    apply_action(car, action)
+                game.step()
+                now = progress()
+                rewards[:] = now - last
+                last = now
+                done = game._steps >= max_steps or bool((game._laps_completed >= max_laps).all())
+                dones[0] = done
+                info = None
+                if done:
+                    info = {
+                        'steps': game._steps,
+                        'laps': game._laps_completed.tolist(),
+                        'lap_times': [list(t) for t in game._lap_times],
+                    }
+                    game.reset()
+                    last = progress()
+                obs[:] = game.observations()
+                conn.send(info)
+            elif cmd == 'reset':
+                game.reset()
+                last = progress()
+                obs[:] = game.observations()
+                rewards[:] = 0
+                dones[0] = False
+                conn.send(None)
+            elif cmd == 'close':
+                break
+    finally:
+        for shm, _ in handles:
+            shm.close()
+        conn.close()
+
+
+class VectorRaceEnv:
+    def __init__(self, num_envs, cars_per_env=1, max_steps=3600, max_laps=1,
+                 fixed_dt_ms=1000.0 / 60.0, vectorized=True, track=None):
+        self.num_envs = int(num_envs)
+        self.cars_per_env = int(cars_per_env)
+        self.obs_fields = OBS_FIELDS
+        track = track if track is not None else Track()
+        # Build the distance field once here so forked workers inherit it.
+        track.distance_field
+
+        layout = (
+            ((self.num_envs, self.cars_per_env, len(OBS_FIELDS)), np.float32),
+            ((self.num_envs, self.cars_per_env), np.int64),
+            ((self.num_envs, self.cars_per_env), np.float32),
+            ((self.num_envs,), np.bool_),
+        )
+        self._shms = []
+        arrays = []
+        specs = []
+        for shape, dtype in layout:
+            nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            arr.fill(0)
+            self._shms.append(shm)
+            arrays.append(arr)
+            specs.append((shm.name, shape, np.dtype(dtype).str))
+        self.observations, self.actions, self.rewards, self.dones = arrays
+
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context('fork' if 'fork' in methods else 'spawn')
+        self._conns = []
+        self._procs = []
+        for index in range(self.num_envs):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker,
+                args=(index, child, track, specs, self.cars_per_env, max_steps, max_laps, fixed_dt_ms, vectorized),
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self._closed = False
+
+    def _broadcast(self, cmd):
+        for conn in self._conns:
+            conn.send(cmd)
+        return [conn.recv() for conn in self._conns]
+
+    def reset(self):
+        self._broadcast('reset')
+        return self.observations
+
+    def step(self, actions=None):
+        if actions is not None:
+            self.actions[:] = actions
+        infos = self._broadcast('step')
+        return self.observations, self.rewards, self.dones, infos
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for conn in self._conns:
+            try:
+                conn.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
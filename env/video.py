@@ -0,0 +1,182 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import multiprocessing as mp
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pygame
+from env.camera import Camera
+from env.constants import CELL_SIZE
+from env.recording import RaceReplay
+
+VIDEO_SUFFIXES = ('.mp4', '.mkv', '.webm', '.mov', '.avi')
+RAW_SUFFIXES = ('.rgb', '.raw')
+
+
+class FrameRenderer:
+    # Draws recorded ticks onto an offscreen Surface with the game's own
+    # Track.render, Car.render, Camera and HUD text. The track under a
+    # fixed camera is drawn once and reused, as F1Game.render does.
+    def __init__(self, replay, track, size=(1280, 720), zoom=None, follow=None, hud=True):
+        from env.game import F1Game
+        if (track.width, track.height) != (replay.metadata['track']['width'], replay.metadata['track']['height']):
+            raise ValueError("Recording was made on a different track")
+        pygame.init()
+        self.replay = replay
+        self.size = tuple(size)
+        self.follow = follow
+        self.hud = hud
+        names = replay.metadata.get('cars') or [str(i) for i in range(replay.num_cars)]
+        self.game = F1Game(model_dirs=names, headless=True, track=track)
+        world_w = track.width * CELL_SIZE
+        world_h = track.height * CELL_SIZE
+        if zoom is None:
+            zoom = min(self.size[0] / world_w, self.size[1] / world_h)
+        self.camera = Camera(self.size[0], self.size[1], world_w, world_h, zoom=zoom)
+        self.surface = pygame.Surface(self.size)
+        self._background = pygame.Surface(self.size)
+        self._background_key = None
+        self._font = pygame.font.Font(None, 24) if hud else None
+
+    def draw(self, tick):
+        game = self.game
+        state = self.replay.state(tick)
+        for car, x, y, angle in zip(game._cars, state['x'].tolist(), state['y'].tolist(), state['angle'].tolist()):
+            car._x = x
+            car._y = y
+            car._angle = angle
+        if self.follow is not None:
+            self.camera.update(game._cars[self.follow])
+
+        key = (self.camera.zoom, self.camera.offset_x, self.camera.offset_y)
+        if key != self._background_key:
+            self._background.fill((0, 0, 0))
+            game._track.render(self._background, self.camera)
+            self._background_key = key
+        surface = self.surface
+        surface.blit(self._background, (0, 0))
+        for car in game._cars:
+            car.render(surface, self.camera)
+
+        if self.hud:
+            game._laps_completed[:] = state['laps']
+            game._checkpoints_collected[:] = state['checkpoints']
+            for idx in range(len(game._cars)):
+                text = self._font.render(game._hud_text(idx), True, (255, 255, 255))
+                surface.blit(text, (10, 10 + idx * 25))
+        return surface
+
+    def rgb(self, tick):
+        return pygame.image.tobytes(self.draw(tick), 'RGB')
+
+
+def _render_segment(recording, track_path, ticks, first_index, size, zoom, follow, hud, target, raw):
+    # Worker: renders one contiguous run of ticks. Raw frames go to one part
+    # file for the parent to stitch; images are written under their final,
+    # frame-numbered names.
+    from env.track import Track
+    track = Track.from_file(track_path) if track_path else Track()
+    renderer = FrameRenderer(RaceReplay(recording), track, size, zoom, follow, hud)
+    if raw:
+        with open(target, 'wb') as f:
+            for tick in ticks:
+                f.write(renderer.rgb(tick))
+    else:
+        for n, tick in enumerate(ticks):
+            pygame.image.save(renderer.draw(tick), os.path.join(target, f"frame_{first_index + n:06d}.png"))
+    return len(ticks)
+
+
+def _split(ticks, parts):
+    size = -(-len(ticks) // max(1, parts))
+    return [(i, ticks[i:i + size]) for i in range(0, len(ticks), size)]
+
+
+def export_frames(recording, output, track_path=None, size=(1280, 720), zoom=None, follow=None,
+                  start=0, stop=None, step=1, workers=None, hud=True, fps=60):
+    # Renders ticks start:stop:step of a recording. The output kind follows
+    # the path: a directory gets frame_NNNNNN.png images, .rgb/.raw a raw
+    # rgb24 stream, and a video suffix is encoded with ffmpeg if installed.
+    # Returns the number of frames written.
+    replay = RaceReplay(recording)
+    ticks = list(range(*slice(start, stop, step).indices(len(replay))))
+    if not ticks:
+        return 0
+    output = Path(output)
+    video = output.suffix.lower() in VIDEO_SUFFIXES
+    raw = video or output.suffix.lower() in RAW_SUFFIXES
+    if video and shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg not found; write a .rgb stream or a frame directory instead")
+    workers = workers or os.cpu_count() or 1
+    segments = _split(ticks, workers)
+
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    parts_dir = Path(tempfile.mkdtemp(prefix='.frames-', dir=output.parent)) if raw else None
+    if not raw:
+        output.mkdir(parents=True, exist_ok=True)
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(segments)), mp_context=ctx) as pool:
+            futures = []
+            for first, part in segments:
+                target = str(parts_dir / f"{first:09d}.part") if raw else str(output)
+                futures.append(pool.submit(_render_segment, str(recording), track_path, part, first,
+                                           tuple(size), zoom, follow, hud, target, raw))
+            written = sum(f.result() for f in futures)
+
+        if raw:
+            parts = [parts_dir / f"{first:09d}.part" for first, _ in segments]
+            if video:
+                _encode(parts, output, size, fps / step)
+            else:
+                tmp = output.with_name(output.name + '.tmp')
+                with open(tmp, 'wb') as out:
+                    for part in parts:
+                        with open(part, 'rb') as f:
+                            shutil.copyfileobj(f, out, 1 << 20)
+                os.replace(tmp, output)
+    finally:
+        if parts_dir is not None:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+    return written
+
+
+def _encode(parts, output, size, fps):
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+           '-s', f"{size[0]}x{size[1]}", '-r', f"{fps:g}", '-i', '-', '-pix_fmt', 'yuv420p', str(output)]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    try:
+        for part in parts:
+            with open(part, 'rb') as f:
+                shutil.copyfileobj(f, proc.stdin, 1 << 20)
+    finally:
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise RuntimeError("ffmpeg failed with exit code " + str(proc.returncode))
+
+
+def record_race(model_dirs, path, steps, track_path=None, laps=None):
+    # Plays a headless race on the fixed clock and records it to path, for
+    # export_frames to pick up.
+    from env.game import F1Game
+    from env.loading import load_model
+    from env.track import Track
+
+    funcs = [load_model(d)[0] for d in model_dirs]
+    track = Track.from_file(track_path) if track_path else None
+    game = F1Game(model_dirs=[Path(d).name for d in model_dirs], headless=True, track=track)
+    game.start_recording(path)
+    try:
+        while game._steps < steps:
+            if laps and bool((game._laps_completed >= laps).all()):
+                break
+            game._apply_controls(funcs)
+            game.step()
+    finally:
+        game.stop_recording()
+    return game._steps
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from env.video import export_frames, record_race
+
+ROOT = Path(__file__).resolve().parent
+
+
+def parse_size(text):
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Render a recorded or headless race to frames or video")
+    parser.add_argument("output", help="frame directory, .rgb/.raw stream, or video file (needs ffmpeg)")
+    parser.add_argument("--recording", default=None, help="race recording to render")
+    parser.add_argument("--models", nargs="*", default=None,
+                        help="run a headless race with these model folders instead (default: every folder in models/)")
+    parser.add_argument("--steps", type=int, default=1800, help="ticks to run when racing headless")
+    parser.add_argument("--track", default=None)
+    parser.add_argument("--size", type=parse_size, default=(1280, 720), help="WIDTHxHEIGHT")
+    parser.add_argument("--zoom", type=float, default=None, help="default: fit the whole track")
+    parser.add_argument("--follow", type=int, default=None, help="car index for the camera to follow")
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--stop", type=int, default=None)
+    parser.add_argument("--step", type=int, default=1, help="render every Nth tick")
+    parser.add_argument("--fps", type=float, default=60.0, help="tick rate of the recording")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-hud", action="store_true")
+    args = parser.parse_args()
+
+    recording = args.recording
+    scratch = None
+    if recording is None:
+        model_dirs = args.models or sorted(str(f) for f in (ROOT / "models").iterdir() if (f / "model.py").exists())
+        fd, scratch = tempfile.mkstemp(suffix=".rec")
+        os.close(fd)
+        recording = scratch
+        start = time.perf_counter()
+        ticks = record_race(model_dirs, recording, args.steps, args.track)
+        print(f"Raced {len(model_dirs)} models for {ticks} ticks in {time.perf_counter() - start:.1f}s")
+
+    try:
+        start = time.perf_counter()
+        frames = export_frames(recording, args.output, args.track, args.size, args.zoom, args.follow,
+                               args.start, args.stop, args.step, args.workers, not args.no_hud, args.fps)
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {frames} frames to {args.output} in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.0f} fps)")
+    finally:
+        if scratch is not None:
+            os.remove(scratch)
@@ -0,0 +1,24 @@
+import time
+
+from env.track_gen import generate_board, save_board, validate_board
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate a closed circuit in the race_track encoding")
+    parser.add_argument("output", help="board file to write (load it with --track)")
+    parser.add_argument("--width", type=int, default=400)
+    parser.add_argument("--height", type=int, default=260)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--road-width", type=int, default=None)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--harmonics", type=int, default=6)
+    parser.add_argument("--roughness", type=float, default=0.6)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    board = generate_board(args.width, args.height, args.seed, args.road_width, args.checkpoints,
+                           args.harmonics, args.roughness)
+    ids = validate_board(board)
+    save_board(board, args.output)
+    print(f"Wrote {args.width}x{args.height} track with checkpoints {ids} to {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
@@ -1,80 +1,104 @@
-import importlib.util
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
+from env.loading import load_model, preload, print_startup_report
 
-def load_single_model(car_folder):
-    try:
-        model_file = car_folder / "model.py"
-        if not model_file.exists():
-            return None
-        
-        print(f"Loading {car_folder.name}...")
-        start = time.time()
-        
-        spec = importlib.util.spec_from_file_location(
-            f"{car_folder.name}.model", 
-            str(model_file)
-        )
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        
-        elapsed = time.time() - start
-        print(f"Loaded {car_folder.name} in {elapsed:.2f}s")
-        
-        if hasattr(mod, "model"):
-            return (car_folder.name, mod.model)
-        else:
-            print(f"{car_folder.name} has no 'model' function")
-            return None
-            
-    except Exception as e:
-        print(f"Failed to load {car_folder.name}: {e}")
-        return None
-
-def load_models_concurrent(models_dir="models", max_workers=4):
+def model_folders(models_dir="models"):
     base_path = Path(models_dir)
-    
     if not base_path.exists():
         print(f"Models directory '{models_dir}' not found!")
         return []
-    
-    car_folders = [f for f in base_path.iterdir() if f.is_dir()]
-    
+    return sorted(f for f in base_path.iterdir() if (f / "model.py").exists())
+
+def load_models(models_dir="models"):
+    # Only for --in-process runs. In-process controllers have to be imported
+    # into this interpreter, and threads do not help an import-bound load
+    # under the GIL, so import the shared heavy modules once and then each
+    # model in turn. The default sandboxed path loads them in parallel.
+    car_folders = model_folders(models_dir)
     if not car_folders:
         print("No model folders found!")
         return []
-    
-    print(f"\nLoading {len(car_folders)} models concurrently...")
-    start_time = time.time()
-    
+
+    print(f"\nLoading {len(car_folders)} models...")
+    origin = time.monotonic()
+    shared = preload()
     models = []
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_folder = {
-            executor.submit(load_single_model, folder): folder 
-            for folder in car_folders
-        }
-        
-        for future in as_completed(future_to_folder):
-            result = future.result()
-            if result is not None:
-                models.append(result)
-    
-    total_time = time.time() - start_time
-    print(f"\nLoaded {len(models)}/{len(car_folders)} models in {total_time:.2f}s")
-    
+    rows = []
+    for folder in car_folders:
+        try:
+            func, timings = load_model(folder)
+        except Exception as e:
+            print(f"Failed to load {folder.name}: {e}")
+            rows.append({'name': folder.name, 'started': origin, 'error': str(e)})
+            continue
+        models.append((folder.name, func))
+        rows.append(timings)
+
+    print_startup_report(rows, origin, shared)
     return models
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--steps", type=int, default=None)
+    parser.add_argument("--profile", default=None,
+                        help="profile the run and export to this path (.csv, .trace.json or .json)")
+    parser.add_argument("--render-fps", type=float, default=None,
+                        help="redraw rate, independent of the 60 Hz simulation")
+    parser.add_argument("--telemetry", action="append", default=[],
+                        help="stream telemetry to ndjson:PATH, columnar:DIR, tcp:HOST:PORT or unix:PATH")
+    parser.add_argument("--track", default=None, help="load the track from this text file")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--in-process", action="store_true",
+                      help="import every model into this process instead of a sandbox each")
+    mode.add_argument("--sandbox", action="store_true",
+                      help="run each model in its own process with a per-tick deadline (the default)")
+    parser.add_argument("--deadline-ms", type=float, default=10.0)
+    parser.add_argument("--fallback", choices=("previous", "noop"), default="previous",
+                        help="action applied when a sandboxed model misses its deadline")
+    args = parser.parse_args()
+
     from env.game import F1Game
-    game = F1Game()
-    models = load_models_concurrent("models", max_workers=4)  
+    pool = None
+    if not args.in_process:
+        # Each model loads in its own worker forked from a warm forkserver,
+        # all at once, and then runs there with a per-tick deadline.
+        from env.sandbox import SandboxPool
+        pool = SandboxPool(model_folders("models"), deadline_ms=args.deadline_ms, fallback=args.fallback)
+        pool.print_startup_report()
+        models = [(name, pool) for name in pool.names]
+    else:
+        models = load_models("models")
     if not models:
         print("No models loaded! Exiting.")
         exit(1)
     
     print(f"\nStarting game with {len(models)} models...")
+    track = None
+    if args.track:
+        from env.track import Track
+        track = Track.from_file(args.track)
+    game = F1Game(model_dirs=[name for name, func in models], headless=args.headless, track=track,
+                  render_fps=args.render_fps)
+    if pool is not None:
+        pool.bind(game)
     
     control_funcs = [func for name, func in models]
-    game.run(control_funcs)
\ No newline at end of file
+    if args.profile:
+        game.set_profiling(True, overlay=not args.headless)
+    if args.telemetry:
+        game.start_telemetry(args.telemetry)
+    try:
+        game.run(control_funcs, max_steps=args.steps)
+    finally:
+        if pool is not None:
+            pool.print_report()
+            pool.close()
+    if args.profile:
+        game.profiler.export(args.profile)
+        print(f"Wrote profile to {args.profile}")
+
+    if args.headless:
+        for idx, name in enumerate(game._model_dirs):
+            print(f"{name}: laps {game._laps_completed[idx]}, lap times {game._lap_times[idx]}")
\ No newline at end of file
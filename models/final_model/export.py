@@ -0,0 +1,90 @@
+import time
+from pathlib import Path
+
+import numpy as np
+
+from models.final_model.numpy_policy import PARAM_NAMES, SOURCE_KEY, NumpyDrivingPolicy, file_hash
+
+HERE = Path(__file__).resolve().parent
+PT_PATH = HERE / "final_model.pt"
+NPZ_PATH = HERE / "final_model.npz"
+
+
+def export(pt_path=PT_PATH, npz_path=NPZ_PATH):
+    # Writes the state dict as an uncompressed .npz so loading it needs
+    # numpy only, tagged with the hash of pt_path so model.py can tell when
+    # the .pt has been replaced since. Written to a temporary file and
+    # renamed into place.
+    import torch
+    state_dict = torch.load(pt_path, map_location="cpu", weights_only=True)
+    arrays = {name: state_dict[name].detach().cpu().numpy().astype(np.float32) for name in PARAM_NAMES}
+    arrays[SOURCE_KEY] = np.array(file_hash(pt_path))
+    npz_path = Path(npz_path)
+    tmp = npz_path.with_suffix(".tmp.npz")
+    np.savez(tmp, **arrays)
+    tmp.replace(npz_path)
+    return npz_path
+
+
+def verify(pt_path=PT_PATH, npz_path=NPZ_PATH, batch=64, seed=0, rtol=1e-5, atol=1e-4):
+    # Compares the numpy runtime with DrivingPolicy on random inputs at
+    # every step index, plus the MLP logits. Returns the max
+    # absolute difference of the logits; raises if any action differs.
+    import torch
+    from models.final_model.network import DrivingPolicy
+
+    state_dict = torch.load(pt_path, map_location="cpu", weights_only=True)
+    ref = DrivingPolicy(max_steps=state_dict["temporal_weights"].shape[0])
+    ref.load_state_dict(state_dict)
+    ref.eval()
+    policy = NumpyDrivingPolicy.load(npz_path)
+
+    rng = np.random.default_rng(seed)
+    x = (rng.standard_normal((batch, 12)) * 100.0).astype(np.float32)
+    xt = torch.from_numpy(x)
+    with torch.inference_mode():
+        logits = ref.head(torch.relu(ref.fc2(torch.relu(ref.fc1(xt))))).numpy()
+        for step in range(policy.max_steps + 2):
+            single = ref(xt[:1], step)
+            if policy.forward(x[:1], step) != single:
+                raise AssertionError(f"forward differs at step {step}")
+            if not np.array_equal(policy.forward_batch(x, step), ref.forward_batch(xt, step).numpy()):
+                raise AssertionError(f"forward_batch differs at step {step}")
+    ours = policy.logits(x)
+    diff = float(np.abs(ours - logits).max())
+    if not np.allclose(ours, logits, rtol=rtol, atol=atol):
+        raise AssertionError(f"logits differ by {diff}")
+    return diff
+
+
+def time_load(npz_path=NPZ_PATH, pt_path=PT_PATH, repeat=20):
+    import torch
+    from models.final_model.network import DrivingPolicy
+
+    def load_torch():
+        state_dict = torch.load(pt_path, map_location="cpu", mmap=True, weights_only=True)
+        policy = DrivingPolicy(max_steps=state_dict["temporal_weights"].shape[0])
+        policy.load_state_dict(state_dict)
+
+    results = {}
+    for name, func in (("numpy", lambda: NumpyDrivingPolicy.load(npz_path)), ("torch", load_torch)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        results[name] = (time.perf_counter() - start) * 1000.0 / repeat
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export final_model.pt to a torch-free .npz")
+    parser.add_argument("--pt", default=str(PT_PATH))
+    parser.add_argument("--npz", default=str(NPZ_PATH))
+    parser.add_argument("--no-verify", action="store_true")
+    args = parser.parse_args()
+
+    path = export(args.pt, args.npz)
+    print(f"Wrote {path} ({path.stat().st_size} bytes)")
+    if not args.no_verify:
+        print(f"Matches DrivingPolicy (max logit difference {verify(args.pt, args.npz):.2e})")
+        print("Load time: " + ", ".join(f"{k} {v:.2f} ms" for k, v in time_load(args.npz, args.pt).items()))
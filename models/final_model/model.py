@@ -1,38 +1,52 @@
 from __future__ import annotations
 
 from pathlib import Path
-import torch
 import numpy as np
-from env.controls import back, boost, brake, forward, steer_left, steer_right
-from models.final_model.network import DrivingPolicy
-
-def apply_action_by_index(car, action_idx: int) -> None:
-    if action_idx == 1:
-        forward(car)
-    elif action_idx == 2:
-        forward(car)
-        steer_left(car)
-    elif action_idx == 3:
-        forward(car)
-        steer_right(car)
-    elif action_idx == 4:
-        back(car)
-    elif action_idx == 5:
-        brake(car)
-    elif action_idx == 6:
-        forward(car)
-        boost(car)
+from env.controls import apply_action, batched
+from car.observation import OBS_INDEX
+from models.final_model.numpy_policy import NumpyDrivingPolicy, file_hash
+
+apply_action_by_index = apply_action
+
+_FEATURE_COLUMNS = [OBS_INDEX[name] for name in (
+    "x", "y", "speed", "angle_degrees", "steering_angle", "lap_progress",
+)]
 
 PT_PATH = Path(__file__).resolve().parent / "final_model.pt"
+# Written by export.py; while it matches final_model.pt the model never
+# imports torch.
+NPZ_PATH = Path(__file__).resolve().parent / "final_model.npz"
+
+
+def _exported_policy():
+    # The exported weights, unless final_model.pt has been replaced since
+    # they were written.
+    policy = NumpyDrivingPolicy.load(NPZ_PATH)
+    if PT_PATH.exists() and policy.source_hash != file_hash(PT_PATH):
+        print(f"{NPZ_PATH.name} is out of date with {PT_PATH.name}; using the .pt "
+              f"(run python -m models.final_model.export to refresh it)")
+        return None
+    return policy
 
 class Controller:
     def __init__(self):
         self.step_count = 0
         self.policy = None
-        
+        self.numpy = False
+
+        if NPZ_PATH.exists():
+            try:
+                self.policy = _exported_policy()
+                if self.policy is not None:
+                    self.numpy = True
+                    return
+            except Exception as e:
+                print(f"Failed to load exported model: {e}")
         if PT_PATH.exists():
             try:
-                state_dict = torch.load(PT_PATH, map_location="cpu")
+                import torch
+                from models.final_model.network import DrivingPolicy
+                state_dict = torch.load(PT_PATH, map_location="cpu", mmap=True, weights_only=True)
                 
                 if "temporal_weights" in state_dict:
                     size = state_dict["temporal_weights"].shape[0]
@@ -53,16 +67,57 @@ class Controller:
             obs.get("steering_angle", 0), obs.get("lap_progress", 0),
             0, 0, 0, 0, 0, 0
         ]
-        x = torch.tensor(feats, dtype=torch.float32).unsqueeze(0)
-        
-        # Forward pass
-        with torch.no_grad():
-            action_idx = self.policy(x, self.step_count)
+        if self.numpy:
+            action_idx = self.policy.forward(np.asarray(feats, dtype=np.float32)[None], self.step_count)
+        else:
+            import torch
+            x = torch.tensor(feats, dtype=torch.float32).unsqueeze(0)
+
+            # Forward pass
+            with torch.inference_mode():
+                action_idx = self.policy(x, self.step_count)
             
         apply_action_by_index(car, action_idx)
         self.step_count += 1
 
+    def act_batch(self, obs_rows):
+        if self.policy is None:
+            return np.zeros(len(obs_rows), dtype=np.int64)
+
+        feats = np.zeros((len(obs_rows), 12), dtype=np.float32)
+        feats[:, :len(_FEATURE_COLUMNS)] = obs_rows[:, _FEATURE_COLUMNS]
+        if self.numpy:
+            actions = self.policy.forward_batch(feats, self.step_count)
+            self.step_count += 1
+            return actions
+
+        import torch
+        x = torch.from_numpy(feats)
+
+        with torch.inference_mode():
+            actions = self.policy.forward_batch(x, self.step_count)
+
+        self.step_count += 1
+        return actions.numpy()
+
+    def warmup(self):
+        if self.policy is None:
+            return
+        if self.numpy:
+            self.policy.forward_batch(np.zeros((1, 12), dtype=np.float32), 0)
+            return
+        import torch
+        with torch.inference_mode():
+            self.policy.forward_batch(torch.zeros((1, 12), dtype=torch.float32), 0)
+
 _CONTROLLER = Controller()
 
+def warmup() -> None:
+    _CONTROLLER.warmup()
+
 def model(car) -> None:
     _CONTROLLER.act(car)
+
+@batched
+def batch_model(obs_rows):
+    return _CONTROLLER.act_batch(obs_rows)
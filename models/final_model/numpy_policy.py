@@ -0,0 +1,52 @@
+import hashlib
+import numpy as np
+
+# Parameter names as they appear in DrivingPolicy.state_dict().
+PARAM_NAMES = ("fc1.weight", "fc1.bias", "fc2.weight", "fc2.bias",
+               "head.weight", "head.bias", "temporal_weights")
+# Stored next to the parameters: sha256 of the .pt they were exported from.
+SOURCE_KEY = "source_sha256"
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class NumpyDrivingPolicy:
+    # DrivingPolicy without torch. The chosen action only depends on
+    # temporal_weights[step_idx], so it is rounded once at load and forward
+    # is a table lookup; the MLP is still available through hidden()/logits().
+    def __init__(self, params, source_hash=None):
+        self.source_hash = source_hash
+        self.params = {name: np.asarray(params[name], dtype=np.float32) for name in PARAM_NAMES}
+        self.temporal_weights = self.params["temporal_weights"]
+        # torch.round and np.rint both round half to even.
+        self._actions = np.rint(self.temporal_weights).astype(np.int64)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            source = str(data[SOURCE_KEY]) if SOURCE_KEY in data.files else None
+            return cls({name: data[name] for name in PARAM_NAMES}, source)
+
+    @property
+    def max_steps(self):
+        return len(self.temporal_weights)
+
+    def hidden(self, x):
+        p = self.params
+        feat = np.maximum(x @ p["fc1.weight"].T + p["fc1.bias"], 0.0)
+        return np.maximum(feat @ p["fc2.weight"].T + p["fc2.bias"], 0.0)
+
+    def logits(self, x):
+        p = self.params
+        return self.hidden(x) @ p["head.weight"].T + p["head.bias"]
+
+    def forward(self, x, step_idx):
+        return int(self._actions[min(step_idx, len(self._actions) - 1)])
+
+    def forward_batch(self, x, step_idx):
+        return np.full(len(x), self._actions[min(step_idx, len(self._actions) - 1)], dtype=np.int64)
+
+    __call__ = forward
@@ -0,0 +1,49 @@
+import shutil
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from models.final_model import model
+from models.final_model.export import NPZ_PATH, PT_PATH, export, verify
+from models.final_model.network import DrivingPolicy
+from models.final_model.numpy_policy import NumpyDrivingPolicy, file_hash
+
+
+def test_committed_npz_matches_pt():
+    assert NumpyDrivingPolicy.load(NPZ_PATH).source_hash == file_hash(PT_PATH)
+    assert verify() <= 1e-4
+
+
+def _use(monkeypatch, pt_path, npz_path):
+    monkeypatch.setattr(model, "PT_PATH", pt_path)
+    monkeypatch.setattr(model, "NPZ_PATH", npz_path)
+
+
+def test_fresh_export_is_used(tmp_path, monkeypatch):
+    pt_path = tmp_path / "final_model.pt"
+    shutil.copyfile(PT_PATH, pt_path)
+    npz_path = export(pt_path, tmp_path / "final_model.npz")
+    _use(monkeypatch, pt_path, npz_path)
+    controller = model.Controller()
+    assert controller.numpy
+    assert isinstance(controller.policy, NumpyDrivingPolicy)
+
+
+def test_stale_export_falls_back_to_pt(tmp_path, monkeypatch, capsys):
+    npz_path = tmp_path / "final_model.npz"
+    shutil.copyfile(NPZ_PATH, npz_path)
+    # Retrained weights saved over the .pt after the .npz was written.
+    state_dict = torch.load(PT_PATH, map_location="cpu", weights_only=True)
+    state_dict["temporal_weights"] = state_dict["temporal_weights"] + 1.0
+    pt_path = tmp_path / "final_model.pt"
+    torch.save(state_dict, pt_path)
+    _use(monkeypatch, pt_path, npz_path)
+
+    controller = model.Controller()
+    assert "out of date" in capsys.readouterr().out
+    assert not controller.numpy
+    assert isinstance(controller.policy, DrivingPolicy)
+    np.testing.assert_array_equal(controller.policy.temporal_weights.numpy(),
+                                  state_dict["temporal_weights"].numpy())
@@ -0,0 +1,27 @@
+import time
+
+from env.dataset import Dataset, generate
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Roll out headless races into a training dataset")
+    parser.add_argument("output", help="dataset directory")
+    parser.add_argument("--behaviour", default="random",
+                        help="random, model:DIR[:EPSILON] or package.module:callable")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--episodes", type=int, default=4, help="episodes per worker")
+    parser.add_argument("--cars", type=int, default=16)
+    parser.add_argument("--max-steps", type=int, default=1800)
+    parser.add_argument("--laps", type=int, default=1)
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--track", default=None)
+    args = parser.parse_args()
+
+    start = time.time()
+    manifest = generate(args.output, args.behaviour, args.workers, args.episodes, args.cars,
+                        args.max_steps, args.laps, args.chunk_rows, args.seed, args.track)
+    elapsed = time.time() - start
+    print(f"Wrote {manifest['rows']} rows in {len(manifest['shards'])} shards to {args.output} "
+          f"in {elapsed:.1f}s ({manifest['rows'] / max(elapsed, 1e-9):.0f} rows/s)")
+    print(f"{len(Dataset(args.output))} rows readable")
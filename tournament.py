@@ -0,0 +1,266 @@
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+CACHE_DIR = ROOT / ".tournament_cache"
+# Everything that decides how a heat plays out besides the models and the
+# track: physics, collisions, lap progress, observations, the clock and
+# how a model's control function is picked. Editing any of them
+# invalidates every cached heat. Rendering, recording, telemetry,
+# profiling, snapshots and the other tools never run in a heat and are
+# left out.
+SIMULATION_MODULES = (
+    "car/car.py", "car/fleet.py", "car/observation.py",
+    "env/chunked.py", "env/clock.py", "env/constants.py", "env/controls.py", "env/distance_field.py",
+    "env/game.py", "env/loading.py", "env/race_track.py", "env/sensors.py", "env/spatial.py",
+    "env/track.py", "env/track_cache.py",
+)
+CACHE_VERSION = 2
+
+
+def hash_files(paths, root=ROOT):
+    # Paths go in relative to root, so a checkout hashes the same wherever
+    # it lives.
+    digest = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        digest.update(path.relative_to(root).as_posix().encode("utf-8") + b"\0")
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def model_hash(model_dir):
+    model_dir = Path(model_dir)
+    files = sorted(p for p in model_dir.rglob("*")
+                   if p.is_file() and "__pycache__" not in p.parts)
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(str(path.relative_to(model_dir)).encode("utf-8") + b"\0")
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def physics_hash():
+    return hash_files(ROOT / name for name in SIMULATION_MODULES)
+
+
+def track_hash(track_path=None):
+    from env.track_cache import board_key, read_board
+    from env.race_track import board
+    return board_key(read_board(track_path) if track_path else board)
+
+
+def heat_key(model_hashes, track_key, physics_key, laps, max_steps, vectorized):
+    payload = json.dumps([CACHE_VERSION, model_hashes, track_key, physics_key, laps, max_steps, vectorized])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def run_heat(model_dirs, track_path, laps, max_steps, vectorized=False):
+    # Runs in a fresh worker process: models keep module-level state, so a
+    # process never serves more than one heat.
+    from car.observation import OBS_INDEX
+    from env.game import F1Game
+    from env.loading import load_model
+    from env.track import Track
+
+    names = [Path(d).name for d in model_dirs]
+    funcs = [load_model(d)[0] for d in model_dirs]
+    track = Track.from_file(track_path) if track_path else None
+    game = F1Game(model_dirs=names, headless=True, fixed_dt_ms=1000.0 / 60.0,
+                  vectorized=vectorized, track=track)
+    start = time.perf_counter()
+    while game._steps < max_steps and not bool((game._laps_completed >= laps).all()):
+        game._apply_controls(funcs)
+        game.step()
+
+    progress = game.observations()[:, OBS_INDEX["lap_progress"]].tolist()
+    cars = []
+    for idx, name in enumerate(names):
+        done = int(game._laps_completed[idx])
+        lap_times = list(game._lap_times[idx])
+        cars.append({
+            "model": name,
+            "laps": done,
+            "lap_times": lap_times,
+            "finished": done >= laps,
+            "total_time": sum(lap_times[:laps]) if done >= laps else None,
+            "progress": done + progress[idx],
+        })
+    order = sorted(range(len(cars)), key=lambda i: (
+        not cars[i]["finished"],
+        cars[i]["total_time"] if cars[i]["finished"] else -cars[i]["progress"],
+    ))
+    for position, idx in enumerate(order):
+        cars[idx]["position"] = position + 1
+    return {"cars": cars, "steps": game._steps, "wall_s": time.perf_counter() - start}
+
+
+def _label(result, heat):
+    # Cache entries are keyed by model content, so two folders holding the
+    # same model share entries; names always come from the heat being asked.
+    for car, name in zip(result["cars"], heat):
+        car["model"] = name
+    return result
+
+
+class Tournament:
+    def __init__(self, model_dirs, track_path=None, cars_per_heat=2, laps=1, max_steps=None,
+                 workers=None, cache_dir=CACHE_DIR, vectorized=False):
+        self.model_dirs = [Path(d) for d in model_dirs]
+        self.names = [d.name for d in self.model_dirs]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Model folder names must be unique")
+        self.track_path = track_path
+        self.cars_per_heat = max(1, min(int(cars_per_heat), len(self.model_dirs)))
+        self.laps = int(laps)
+        self.max_steps = int(max_steps) if max_steps else 3600 * self.laps
+        self.workers = workers
+        self.cache_dir = Path(cache_dir)
+        self.vectorized = vectorized
+        self._hashes = {d.name: model_hash(d) for d in self.model_dirs}
+        self._dirs = {d.name: d for d in self.model_dirs}
+        self._track_key = track_hash(track_path)
+        self._physics_key = physics_hash()
+        self.cached = 0
+        self.ran = 0
+
+    def _key(self, heat):
+        return heat_key([self._hashes[n] for n in heat], self._track_key, self._physics_key,
+                        self.laps, self.max_steps, self.vectorized)
+
+    def run_heats(self, heats):
+        # Returns one result per heat, in order, from the cache where possible
+        # and from the process pool otherwise.
+        results = [None] * len(heats)
+        todo = []
+        for i, heat in enumerate(heats):
+            path = self.cache_dir / (self._key(heat) + ".json")
+            if path.exists():
+                results[i] = _label(json.loads(path.read_text()), heat)
+                self.cached += 1
+            else:
+                todo.append(i)
+        if not todo:
+            return results
+
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, max_tasks_per_child=1) as pool:
+            futures = {
+                pool.submit(run_heat, [str(self._dirs[n]) for n in heats[i]], self.track_path,
+                            self.laps, self.max_steps, self.vectorized): i
+                for i in todo
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                result = _label(future.result(), heats[i])
+                results[i] = result
+                self.ran += 1
+                path = self.cache_dir / (self._key(heats[i]) + ".json")
+                tmp = path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(result))
+                tmp.replace(path)
+                print(f"  heat {' vs '.join(heats[i])}: "
+                      + ", ".join(f"{c['position']}. {c['model']}" for c in sorted(result["cars"], key=lambda c: c["position"])))
+        return results
+
+    def round_robin(self):
+        heats = [list(h) for h in itertools.combinations(self.names, self.cars_per_heat)]
+        return list(zip(heats, self.run_heats(heats)))
+
+    def bracket(self, advance=1, seed=0):
+        # Single elimination: each round splits the survivors into heats and
+        # the top `advance` of every heat go through, until one heat is left.
+        entrants = list(self.names)
+        if len(entrants) > self.cars_per_heat and not 1 <= advance < self.cars_per_heat:
+            raise ValueError(f"advance must be at least 1 and less than cars per heat ({self.cars_per_heat})")
+        random.Random(seed).shuffle(entrants)
+        played = []
+        while True:
+            heats = [entrants[i:i + self.cars_per_heat] for i in range(0, len(entrants), self.cars_per_heat)]
+            results = self.run_heats(heats)
+            played.extend(zip(heats, results))
+            if len(heats) == 1:
+                return played
+            survivors = []
+            for result in results:
+                ranked = sorted(result["cars"], key=lambda c: c["position"])
+                survivors.extend(c["model"] for c in ranked[:advance])
+            # A round that knocks nobody out would repeat forever.
+            if len(survivors) <= 1 or len(survivors) >= len(entrants):
+                return played
+            entrants = survivors
+
+
+def standings(played):
+    table = {}
+    for heat, result in played:
+        size = len(result["cars"])
+        for car in result["cars"]:
+            row = table.setdefault(car["model"], {
+                "model": car["model"], "heats": 0, "wins": 0, "points": 0,
+                "positions": [], "lap_times": [],
+            })
+            row["heats"] += 1
+            row["wins"] += car["position"] == 1
+            row["points"] += size - car["position"]
+            row["positions"].append(car["position"])
+            row["lap_times"].extend(car["lap_times"])
+    rows = []
+    for row in table.values():
+        laps = row.pop("lap_times")
+        positions = row.pop("positions")
+        row["mean_position"] = sum(positions) / len(positions)
+        row["best_lap"] = min(laps) if laps else None
+        row["mean_lap"] = sum(laps) / len(laps) if laps else None
+        rows.append(row)
+    rows.sort(key=lambda r: (-r["points"], -r["wins"], r["mean_position"]))
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a headless tournament between models")
+    parser.add_argument("models", nargs="*", help="model folders (default: every folder in models/)")
+    parser.add_argument("--format", choices=("round-robin", "bracket"), default="round-robin")
+    parser.add_argument("--cars-per-heat", type=int, default=2)
+    parser.add_argument("--advance", type=int, default=1, help="bracket: cars per heat that go through")
+    parser.add_argument("--laps", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--track", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vectorized", action="store_true")
+    parser.add_argument("--output", default=None, help="write heats and standings as JSON")
+    args = parser.parse_args()
+
+    model_dirs = args.models or sorted(f for f in (ROOT / "models").iterdir() if (f / "model.py").exists())
+    tournament = Tournament(model_dirs, args.track, args.cars_per_heat, args.laps, args.max_steps,
+                            args.workers, vectorized=args.vectorized)
+    print(f"{args.format} with {len(model_dirs)} models, {tournament.cars_per_heat} per heat, {args.laps} laps")
+    start = time.time()
+    if args.format == "bracket":
+        played = tournament.bracket(args.advance, args.seed)
+    else:
+        played = tournament.round_robin()
+    table = standings(played)
+
+    print(f"\n{len(played)} heats ({tournament.ran} run, {tournament.cached} cached) in {time.time() - start:.1f}s\n")
+    print(f"  {'model':<20} {'pts':>4} {'wins':>4} {'heats':>5} {'avg pos':>7} {'best lap':>9}")
+    for row in table:
+        best = f"{row['best_lap']:.2f}s" if row["best_lap"] is not None else "-"
+        print(f"  {row['model']:<20} {row['points']:>4} {row['wins']:>4} {row['heats']:>5} "
+              f"{row['mean_position']:>7.2f} {best:>9}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "heats": [{"models": heat, **result} for heat, result in played],
+            "standings": table,
+        }, indent=2))